@@ -1,6 +1,8 @@
 import cv2
 import numpy as np
 
+from logo_index import LogoIndex
+
 def generate_logo_scales(logo, scales=[0.5, 0.75, 1.0, 1.25, 1.5, 2.0]):
     """Генерирует логотип в разных масштабах."""
     scaled_logos = []
@@ -12,7 +14,15 @@ def generate_logo_scales(logo, scales=[0.5, 0.75, 1.0, 1.25, 1.5, 2.0]):
     return scaled_logos
 
 def find_best_logo_match(image, logo_scales, threshold=0.8):
-    """Ищет логотип в разных масштабах и возвращает лучший результат."""
+    """
+    Ищет логотип в разных масштабах и возвращает лучший результат.
+    logo_scales — список из generate_logo_scales или готовый LogoIndex: индекс строится один раз
+    на набор логотипов и не пересчитывает серые шаблоны на каждой странице.
+    """
+    if isinstance(logo_scales, LogoIndex):
+        matches = logo_scales.detect(image, threshold=threshold)
+        return matches[0] if matches else None
+
     gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     best_match = None
     best_confidence = -1
@@ -27,6 +37,7 @@ def find_best_logo_match(image, logo_scales, threshold=0.8):
             best_match = {
                 "logo": logo,
                 "position": max_loc,
+                "size": (logo.shape[1], logo.shape[0]),
                 "confidence": max_val,
                 "scale": logo.shape[1] / logo_scales[0].shape[1]  # исходный scale
             }
@@ -37,17 +48,18 @@ def find_best_logo_match(image, logo_scales, threshold=0.8):
 pdf_image = pdf_to_image("document.pdf")  # исходное или масштабированное изображение
 logo = cv2.imread("logo.png")  # эталонный логотип (например, 64x64)
 
-# Генерируем масштабы логотипа
-scaled_logos = generate_logo_scales(logo)
+# Индекс масштабов логотипа строится один раз и переиспользуется для всех страниц
+logo_index = LogoIndex()
+logo_index.add("logo", logo)
 
 # Ищем лучший вариант
-best_match = find_best_logo_match(pdf_image, scaled_logos, threshold=0.7)
+best_match = find_best_logo_match(pdf_image, logo_index, threshold=0.7)
 
 if best_match:
     print(f"Логотип найден! Scale: {best_match['scale']:.2f}, Confidence: {best_match['confidence']:.2f}")
     # Рисуем bounding box
     x, y = best_match["position"]
-    w, h = best_match["logo"].shape[1], best_match["logo"].shape[0]
+    w, h = best_match["size"]
     cv2.rectangle(pdf_image, (x, y), (x + w, y + h), (0, 255, 0), 2)
     cv2.imwrite("result.jpg", pdf_image)
 else:
@@ -1,12 +1,164 @@
 import asyncio
+import contextvars
+import json
+import os
+import sys
+import time
+from collections import defaultdict, deque
 import pandas as pd
 from openai import AsyncOpenAI
-from typing import AsyncGenerator, List
+from typing import AsyncGenerator, Dict, List, Optional
 
-async def llm_client(prompt: str, api_url: str, api_key: str = "EMPTY"):
+# Границы бакетов гистограммы латентности (секунды)
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+
+class PipelineMetrics:
+    """Счётчики и гистограммы пайплайна в разрезе api_url"""
+
+    def __init__(self, total_rows: int = 0, window: int = 10000):
+        """
+        :param total_rows: сколько строк ожидается всего (для ETA)
+        :param window: сколько последних латентностей хранить для p50/p95
+        """
+        self.total_rows = total_rows
+        self.started_at = time.monotonic()
+        self.rows_done = 0
+        self.queue_depth = 0
+        self.requests = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.prompt_tokens = defaultdict(int)
+        self.completion_tokens = defaultdict(int)
+        self.latency_sum = defaultdict(float)
+        self.latency_buckets = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+        self.latency_window = defaultdict(lambda: deque(maxlen=window))
+
+    def observe_request(self, api_url: str, latency: float, ok: bool = True):
+        self.requests[api_url] += 1
+        if not ok:
+            self.errors[api_url] += 1
+        self.latency_sum[api_url] += latency
+        self.latency_window[api_url].append(latency)
+        buckets = self.latency_buckets[api_url]
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                buckets[i] += 1
+                break
+
+    def observe_usage(self, api_url: str, usage):
+        """Учитывает response.usage (может отсутствовать у некоторых серверов)"""
+        if usage is None:
+            return
+        self.prompt_tokens[api_url] += getattr(usage, "prompt_tokens", 0) or 0
+        self.completion_tokens[api_url] += getattr(usage, "completion_tokens", 0) or 0
+
+    def quantile(self, api_url: str, q: float) -> Optional[float]:
+        window = sorted(self.latency_window[api_url])
+        if not window:
+            return None
+        return window[min(len(window) - 1, int(q * len(window)))]
+
+    def snapshot(self) -> Dict:
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        completion_total = sum(self.completion_tokens.values())
+        rows_per_s = self.rows_done / elapsed
+        remaining = max(self.total_rows - self.rows_done, 0)
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "rows_done": self.rows_done,
+            "total_rows": self.total_rows,
+            "rows_per_s": round(rows_per_s, 3),
+            "completion_tokens_per_s": round(completion_total / elapsed, 3),
+            "queue_depth": self.queue_depth,
+            "eta_s": round(remaining / rows_per_s, 1) if rows_per_s > 0 else None,
+            "endpoints": {
+                url: {
+                    "requests": self.requests[url],
+                    "errors": self.errors[url],
+                    "prompt_tokens": self.prompt_tokens[url],
+                    "completion_tokens": self.completion_tokens[url],
+                    "p50_s": self.quantile(url, 0.50),
+                    "p95_s": self.quantile(url, 0.95),
+                }
+                for url in self.requests
+            },
+        }
+
+    def progress_line(self) -> str:
+        s = self.snapshot()
+        eta = f"{s['eta_s']:.0f}s" if s["eta_s"] is not None else "?"
+        return (
+            f"{s['rows_done']}/{s['total_rows']} строк | {s['rows_per_s']:.1f} строк/с | "
+            f"{s['completion_tokens_per_s']:.0f} ток/с | очередь {s['queue_depth']} | ETA {eta}"
+        )
+
+    def to_prometheus(self) -> str:
+        """Текстовый формат Prometheus exposition (строки одного семейства идут подряд)"""
+        lines = [
+            "# TYPE llm_pipeline_rows_done counter",
+            f"llm_pipeline_rows_done {self.rows_done}",
+            "# TYPE llm_pipeline_queue_depth gauge",
+            f"llm_pipeline_queue_depth {self.queue_depth}",
+        ]
+        labels = {url: f'api_url="{url}"' for url in self.requests}
+        lines.append("# TYPE llm_requests_total counter")
+        lines += [f"llm_requests_total{{{l}}} {self.requests[url]}" for url, l in labels.items()]
+        lines.append("# TYPE llm_request_errors_total counter")
+        lines += [f"llm_request_errors_total{{{l}}} {self.errors[url]}" for url, l in labels.items()]
+        lines.append("# TYPE llm_tokens_total counter")
+        for url, l in labels.items():
+            lines.append(f'llm_tokens_total{{{l},kind="prompt"}} {self.prompt_tokens[url]}')
+            lines.append(f'llm_tokens_total{{{l},kind="completion"}} {self.completion_tokens[url]}')
+        lines.append("# TYPE llm_request_latency_seconds histogram")
+        for url, l in labels.items():
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets[url]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else bound
+                lines.append(f'llm_request_latency_seconds_bucket{{{l},le="{le}"}} {cumulative}')
+            lines.append(f"llm_request_latency_seconds_sum{{{l}}} {self.latency_sum[url]}")
+            lines.append(f"llm_request_latency_seconds_count{{{l}}} {self.requests[url]}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str):
+        """Пишет снимок в JSON или Prometheus (.prom/.txt) атомарно через временный файл"""
+        if path.endswith((".prom", ".txt")):
+            payload = self.to_prometheus()
+        else:
+            payload = json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+
+# Метрики текущего воркера — llm_client пишет сюда usage, не меняя сигнатуру llm_client_func
+current_metrics: contextvars.ContextVar[Optional[PipelineMetrics]] = contextvars.ContextVar(
+    "current_metrics", default=None
+)
+
+
+async def report_metrics(
+    metrics: PipelineMetrics,
+    queue: asyncio.Queue,
+    interval: float,
+    show_progress: bool,
+    metrics_path: Optional[str],
+):
+    """Периодически обновляет глубину очереди, печатает прогресс и сбрасывает метрики на диск"""
+    while True:
+        metrics.queue_depth = queue.qsize()
+        if show_progress:
+            print("\r" + metrics.progress_line(), end="", file=sys.stderr, flush=True)
+        if metrics_path:
+            metrics.dump(metrics_path)
+        await asyncio.sleep(interval)
+
+async def llm_client(prompt: str, api_url: str, api_key: str = "EMPTY", max_retries: int = 2):
     client = AsyncOpenAI(
         api_key=api_key,
-        base_url=api_url
+        base_url=api_url,
+        max_retries=max_retries  # 2 — значение SDK по умолчанию
     )
     response = await client.chat.completions.create(
         model="your_model_name",  # Укажите имя модели, если нужно
@@ -14,6 +166,9 @@ async def llm_client(prompt: str, api_url: str, api_key: str = "EMPTY"):
         max_tokens=512,
         temperature=0.7
     )
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.observe_usage(api_url, getattr(response, "usage", None))
     return response.choices[0].message.content
 
 async def batch_generator(df: pd.DataFrame, batch_size: int, queue: asyncio.Queue, num_workers: int):
@@ -25,22 +180,32 @@ async def batch_generator(df: pd.DataFrame, batch_size: int, queue: asyncio.Queu
     for _ in range(num_workers):
         await queue.put(None)  # Сигнал для остановки
 
-async def process_batch_and_add_result(batch, llm_client_func, api_url: str):
+async def process_batch_and_add_result(batch, llm_client_func, api_url: str, metrics: Optional[PipelineMetrics] = None):
     """Обработка одного батча"""
     results = []
     for idx, row in batch.iterrows():
         prompt = row.get("text", "")
-        result = await llm_client_func(prompt, api_url)
+        started = time.monotonic()
+        try:
+            result = await llm_client_func(prompt, api_url)
+        except Exception:
+            if metrics is not None:
+                metrics.observe_request(api_url, time.monotonic() - started, ok=False)
+            raise
+        if metrics is not None:
+            metrics.observe_request(api_url, time.monotonic() - started)
+            metrics.rows_done += 1
         results.append(result)
     return results
 
-async def worker(queue: asyncio.Queue, llm_client_func, api_url: str, results_queue: asyncio.Queue):
+async def worker(queue: asyncio.Queue, llm_client_func, api_url: str, results_queue: asyncio.Queue, metrics: Optional[PipelineMetrics] = None):
     """Рабочий процесс: берет батч из очереди, обрабатывает, кладет результат в другую очередь"""
+    current_metrics.set(metrics)
     while True:
         batch = await queue.get()
         if batch is None:  # Сигнал остановки
             break
-        results = await process_batch_and_add_result(batch, llm_client_func, api_url)
+        results = await process_batch_and_add_result(batch, llm_client_func, api_url, metrics)
         await results_queue.put(results)
         queue.task_done()
 
@@ -49,11 +214,25 @@ async def process_dataframe_async_streaming(
     llm_client_func,
     api_urls: List[str],
     batch_size: int = 10,
-    max_batches_in_queue: int = 4
+    max_batches_in_queue: int = 4,
+    metrics: Optional[PipelineMetrics] = None,
+    show_progress: bool = False,
+    metrics_path: Optional[str] = None,
+    report_interval: float = 1.0,
 ):
     """
     Обработка датафрейма с асинхронной генерацией батчей и буфером
+
+    :param metrics: куда собирать метрики (создаётся автоматически, если нужен прогресс или дамп)
+    :param show_progress: печатать строку прогресса/ETA в stderr
+    :param metrics_path: периодически сбрасывать метрики в файл (.json или .prom)
+    :param report_interval: период обновления прогресса и дампа, секунды
     """
+    if metrics is None and (show_progress or metrics_path):
+        metrics = PipelineMetrics()
+    if metrics is not None and not metrics.total_rows:
+        metrics.total_rows = len(df)
+
     # Очередь для батчей
     batch_queue = asyncio.Queue(maxsize=max_batches_in_queue)
     # Очередь для результатов
@@ -66,10 +245,16 @@ async def process_dataframe_async_streaming(
 
     # Запускаем рабочие задачи (по числу API)
     workers = [
-        asyncio.create_task(worker(batch_queue, llm_client_func, api_url, results_queue))
+        asyncio.create_task(worker(batch_queue, llm_client_func, api_url, results_queue, metrics))
         for api_url in api_urls
     ]
 
+    reporter = None
+    if metrics is not None:
+        reporter = asyncio.create_task(
+            report_metrics(metrics, batch_queue, report_interval, show_progress, metrics_path)
+        )
+
     all_results = []
     # Считываем результаты по мере готовности
     for _ in range(len(api_urls)):
@@ -85,4 +270,12 @@ async def process_dataframe_async_streaming(
     for w in workers:
         await w
 
+    if reporter is not None:
+        reporter.cancel()
+        metrics.queue_depth = batch_queue.qsize()
+        if show_progress:
+            print("\r" + metrics.progress_line(), file=sys.stderr, flush=True)
+        if metrics_path:
+            metrics.dump(metrics_path)
+
     return all_results
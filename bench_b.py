@@ -0,0 +1,124 @@
+import argparse
+import asyncio
+import contextvars
+import functools
+import json
+import time
+
+import pandas as pd
+import uvicorn
+
+from b import PipelineMetrics, llm_client, process_dataframe_async_streaming
+from mock_llm import add_mock_args, config_from_args, create_app
+
+
+# Выставляет safe_llm_client, читает BenchMetrics: контекст у них общий — это одна задача воркера
+request_failed: contextvars.ContextVar[bool] = contextvars.ContextVar("request_failed", default=False)
+
+
+class BenchMetrics(PipelineMetrics):
+    """Проглоченная safe_llm_client ошибка идёт в errors, а её латентность — мимо p50/p95"""
+
+    def observe_request(self, api_url: str, latency: float, ok: bool = True):
+        if request_failed.get():
+            request_failed.set(False)
+            self.requests[api_url] += 1
+            self.errors[api_url] += 1
+            return
+        super().observe_request(api_url, latency, ok)
+
+
+async def safe_llm_client(prompt: str, api_url: str, max_retries: int = 0):
+    """
+    Ошибка эндпоинта не должна ронять воркер — считаем строку незавершённой.
+    Повторы SDK по умолчанию выключены: иначе --error-rate мока прячется, а в хвост латентности попадает backoff.
+    """
+    try:
+        return await llm_client(prompt, api_url, max_retries=max_retries)
+    except Exception:
+        request_failed.set(True)
+        return None
+
+
+async def start_mock_servers(args) -> list:
+    """Поднимает N фейковых эндпоинтов в текущем event loop"""
+    servers = []
+    for i in range(args.endpoints):
+        app = create_app(config_from_args(args, seed=args.seed + i))
+        config = uvicorn.Config(app, host="127.0.0.1", port=args.base_port + i, log_level="warning")
+        server = uvicorn.Server(config)
+        server.task = asyncio.create_task(server.serve())
+        servers.append(server)
+
+    while not all(s.started for s in servers):
+        await asyncio.sleep(0.05)
+    return servers
+
+
+async def run_benchmark(args) -> dict:
+    servers = await start_mock_servers(args)
+    api_urls = [f"http://127.0.0.1:{args.base_port + i}/v1" for i in range(args.endpoints)]
+    df = pd.DataFrame({"text": [f"строка номер {i} для проверки пайплайна" for i in range(args.rows)]})
+
+    metrics = BenchMetrics(total_rows=len(df))
+    started = time.monotonic()
+    try:
+        results = await process_dataframe_async_streaming(
+            df,
+            functools.partial(safe_llm_client, max_retries=args.max_retries),
+            api_urls,
+            batch_size=args.batch_size,
+            max_batches_in_queue=args.max_batches_in_queue,
+            metrics=metrics,
+            show_progress=not args.quiet,
+        )
+    finally:
+        for s in servers:
+            s.should_exit = True
+        await asyncio.gather(*(s.task for s in servers))
+    elapsed = time.monotonic() - started
+
+    latencies = sorted(l for window in metrics.latency_window.values() for l in window)
+
+    def q(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else None
+
+    return {
+        "endpoints": args.endpoints,
+        "rows": args.rows,
+        "completed": sum(r is not None for r in results),
+        "failed": sum(r is None for r in results),
+        "elapsed_s": round(elapsed, 3),
+        "rows_per_s": round(len(results) / elapsed, 2),
+        "completion_tokens_per_s": round(sum(metrics.completion_tokens.values()) / elapsed, 1),
+        "p50_s": q(0.50),
+        "p95_s": q(0.95),
+        "p99_s": q(0.99),
+        "per_endpoint": metrics.snapshot()["endpoints"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный бенчмарк пайплайна b.py на фейковых эндпоинтах")
+    parser.add_argument("--endpoints", type=int, default=4, help="Сколько фейковых эндпоинтов поднять")
+    parser.add_argument("--base-port", type=int, default=18001)
+    parser.add_argument("--rows", type=int, default=400)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--max-batches-in-queue", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-retries", type=int, default=0, help="Повторы OpenAI SDK на запрос (0 — без повторов)")
+    parser.add_argument("--quiet", action="store_true", help="Не печатать строку прогресса")
+    parser.add_argument("--output", "-o", help="Сохранить отчёт в JSON")
+    add_mock_args(parser)
+    args = parser.parse_args()
+
+    report = asyncio.run(run_benchmark(args))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from logo_index import LogoIndex
+
+
+def make_logo(rng, size: int = 64) -> np.ndarray:
+    """Синтетический логотип: цветные круги и надпись на белом"""
+    logo = np.full((size, size, 3), 255, np.uint8)
+    for _ in range(6):
+        color = tuple(int(c) for c in rng.integers(0, 200, 3))
+        center = tuple(int(c) for c in rng.integers(0, size, 2))
+        cv2.circle(logo, center, int(rng.integers(size // 12, size // 3)), color, -1)
+    cv2.putText(logo, "AB", (size // 12, size * 3 // 4), cv2.FONT_HERSHEY_SIMPLEX, size / 50, (0, 0, 0), 3)
+    return logo
+
+
+def make_page(rng, logos: list, scales, width: int = 1240, height: int = 1754) -> tuple:
+    """Страница с текстом и 0-2 логотипами в случайных масштабах; возвращает (страница, [(логотип, x, y, масштаб)])"""
+    page = np.full((height, width, 3), 255, np.uint8)
+    for y in range(120, height - 60, 28):
+        cv2.putText(page, "lorem ipsum dolor sit amet consectetur", (80, y), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (30, 30, 30), 1)
+    placed = []
+    for logo_idx in rng.choice(len(logos), size=int(rng.integers(0, 3)), replace=False):
+        scale = float(rng.choice(scales))
+        logo = cv2.resize(logos[logo_idx], None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        h, w = logo.shape[:2]
+        x, y = int(rng.integers(0, width - w)), int(rng.integers(0, height - h))
+        page[y:y + h, x:x + w] = logo
+        placed.append((int(logo_idx), x, y, scale))
+    return page, placed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Грубо-точный поиск логотипов против полного перебора")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--logos", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", "-o", help="Сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    logos = [make_logo(rng) for _ in range(args.logos)]
+    index = LogoIndex()
+    for i, logo in enumerate(logos):
+        index.add(f"logo{i}", logo)
+    pages = [make_page(rng, logos, index.scales) for _ in range(args.pages)]
+
+    timings = {"exhaustive": 0.0, "coarse": 0.0}
+    results = {}
+    for mode in timings:
+        results[mode] = []
+        for page, _ in pages:
+            started = time.perf_counter()
+            results[mode].append(index.detect(page, args.threshold, coarse=mode == "coarse"))
+            timings[mode] += time.perf_counter() - started
+
+    def key(matches):
+        return sorted((m["logo"], m["position"], m["scale"]) for m in matches)
+
+    same = sum(key(a) == key(b) for a, b in zip(results["exhaustive"], results["coarse"]))
+    found = sum(
+        any(m["logo"] == f"logo{i}" and abs(m["position"][0] - x) <= 1 and abs(m["position"][1] - y) <= 1
+            for m in matches)
+        for matches, (_, placed) in zip(results["coarse"], pages) for i, x, y, _ in placed
+    )
+    report = {
+        "pages": args.pages,
+        "placed_logos": sum(len(p) for _, p in pages),
+        "found_by_coarse": found,
+        "pages_identical_to_exhaustive": same,
+        "exhaustive_ms_per_page": round(timings["exhaustive"] / args.pages * 1000, 1),
+        "coarse_ms_per_page": round(timings["coarse"] / args.pages * 1000, 1),
+        "speedup": round(timings["exhaustive"] / timings["coarse"], 1),
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Подпроцессы запускаются из каталога репозитория: `import pa` не зависит от текущего cwd
+REPO_DIR = Path(__file__).resolve().parent
+
+# Что импортирует воркер до первого документа: старый вариант тянул все бэкенды сразу
+SCENARIOS = {
+    "pa": "import pa",
+    "pa+pdf": "import pa, fitz",
+    # docx.document есть только в python-docx: одноимённый модуль рядом упадёт сразу, а не тихо подменит пакет
+    "pa+docx": "import pa, docx.document",
+    "eager_backends": "import fitz, docx.document, pandas",
+}
+
+
+def time_import(code: str, repeats: int) -> list:
+    """Холодный импорт в свежем интерпретаторе; вычитаем стоимость пустого запуска"""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(REPO_DIR), os.getenv("PYTHONPATH")]))}
+
+    def run(snippet: str) -> float:
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", snippet], check=True, cwd=REPO_DIR, env=env)
+        return time.perf_counter() - started
+
+    return [run(code) - run("pass") for _ in range(repeats)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время импорта pa.py и бэкендов в свежем процессе")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", "-o", help="Сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    report = {}
+    for name, code in SCENARIOS.items():
+        samples = time_import(code, args.repeats)
+        report[name] = {
+            "median_ms": round(statistics.median(samples) * 1000, 1),
+            "min_ms": round(min(samples) * 1000, 1),
+        }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import io
+import json
+import time
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+
+from raster import pixmap_to_pil
+
+
+def pixmap_to_pil_png(pix):
+    """Прежний путь из q.py: PNG-кодирование и декодирование ради смены режима"""
+    if pix.alpha or pix.colorspace.n == 4:
+        # В q.py CMYK не обрабатывался вовсе (tobytes("png") падает), здесь — честная база для сравнения
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    pil_img = Image.open(io.BytesIO(pix.tobytes("png")))
+    if pil_img.mode in ("RGBA", "LA"):
+        background = Image.new("RGB", pil_img.size, (255, 255, 255))
+        background.paste(pil_img, mask=pil_img.split()[-1])
+        pil_img = background
+    return pil_img.convert("RGB")
+
+
+def make_pixmaps(width: int, height: int) -> dict:
+    """Страница с текстом и полупрозрачной заливкой в разных цветовых пространствах"""
+    doc = fitz.open()
+    page = doc.new_page(width=width, height=height)
+    page.draw_rect(fitz.Rect(20, 20, width / 2, height / 2), color=(1, 0, 0), fill=(0, 0, 1), fill_opacity=0.4)
+    for i in range(40):
+        page.insert_text((30, 40 + i * 18), f"Строка {i}: проверка конвертации пиксмапа " * 2, fontsize=11)
+    return {
+        "rgb": page.get_pixmap(alpha=False),
+        "rgba": page.get_pixmap(alpha=True),
+        "gray": page.get_pixmap(colorspace=fitz.csGRAY, alpha=False),
+        "cmyk": page.get_pixmap(colorspace=fitz.csCMYK, alpha=False),
+    }
+
+
+def best_of(func, pix, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func(pix)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pix.samples -> PIL против PNG-раунд-трипа")
+    parser.add_argument("--width", type=int, default=1240)
+    parser.add_argument("--height", type=int, default=1754)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--output", "-o", help="Сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    report = {}
+    for name, pix in make_pixmaps(args.width, args.height).items():
+        png_s = best_of(pixmap_to_pil_png, pix, args.repeats)
+        direct_s = best_of(pixmap_to_pil, pix, args.repeats)
+        diff = np.abs(np.asarray(pixmap_to_pil_png(pix), dtype=np.int16) - np.asarray(pixmap_to_pil(pix), dtype=np.int16))
+        report[name] = {
+            "png_ms": round(png_s * 1000, 2),
+            "direct_ms": round(direct_s * 1000, 2),
+            "speedup": round(png_s / direct_s, 1),
+            "max_abs_diff": int(diff.max()),
+        }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
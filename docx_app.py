@@ -0,0 +1,292 @@
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+import docx
+from docx.document import Document
+from docx.oxml.shared import qn
+from docx.oxml.text.paragraph import CT_P
+from docx.text.paragraph import Paragraph
+from docx.oxml.shared import OxmlElement
+import zipfile
+from io import BytesIO
+import asyncio
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from lxml import etree
+
+# Разбор документов идёт в пуле процессов, чтобы не блокировать event loop
+DOCX_WORKERS = int(os.getenv("DOCX_WORKERS", str(os.cpu_count() or 1)))
+DOCX_MAX_PENDING = int(os.getenv("DOCX_MAX_PENDING", str(DOCX_WORKERS * 4)))   # сверх — 503
+DOCX_SPOOL_THRESHOLD = int(os.getenv("DOCX_SPOOL_THRESHOLD", str(8 * 1024 * 1024)))  # крупнее — через файл
+DOCX_MAX_UPLOAD_BYTES = int(os.getenv("DOCX_MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))  # крупнее — 413
+
+executor: ProcessPoolExecutor | None = None
+pending_jobs = 0
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global executor
+    executor = ProcessPoolExecutor(max_workers=DOCX_WORKERS)
+    try:
+        yield
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(lifespan=lifespan)
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+A_NS = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+V_NS = 'urn:schemas-microsoft-com:vml'
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+W = '{%s}' % W_NS
+R_ID = '{%s}id' % R_NS
+R_EMBED = '{%s}embed' % R_NS
+A_BLIP = '{%s}blip' % A_NS
+V_IMAGEDATA = '{%s}imagedata' % V_NS
+
+
+class DocxPackage:
+    """
+    DOCX как zip-пакет без полной загрузки: связи (rels) читаются сразу — они маленькие,
+    медиа — лениво, только при обращении к read_media.
+    """
+
+    def __init__(self, source):
+        self.zip = zipfile.ZipFile(source)
+        self.rels = self._load_rels('word/_rels/document.xml.rels')
+
+    def _load_rels(self, name: str) -> dict:
+        rels = {}
+        if name not in self.zip.NameToInfo:
+            return rels
+        with self.zip.open(name) as f:
+            for rel in etree.parse(f).getroot().iter('{%s}Relationship' % PKG_REL_NS):
+                target = rel.get('Target')
+                if rel.get('TargetMode') != 'External':
+                    # Внутренние цели задаются относительно word/
+                    target = posixpath.normpath(posixpath.join('word', target))
+                rels[rel.get('Id')] = target
+        return rels
+
+    def media_names(self) -> list:
+        return [name for name in self.zip.namelist() if name.startswith('word/media/')]
+
+    def media_size(self, name: str) -> int | None:
+        info = self.zip.NameToInfo.get(name)
+        return info.file_size if info else None
+
+    def read_media(self, name: str) -> bytes:
+        with self.zip.open(name) as f:
+            return f.read()
+
+    def close(self):
+        self.zip.close()
+
+
+def _run_text(element) -> str:
+    """Текст параграфа/ячейки с учётом табуляций и переносов"""
+    parts = []
+    for node in element.iter(W + 't', W + 'tab', W + 'br', W + 'cr'):
+        if node.tag == W + 't':
+            parts.append(node.text or '')
+        elif node.tag == W + 'tab':
+            parts.append('\t')
+        else:
+            parts.append('\n')
+    return ''.join(parts)
+
+
+def _inline_refs(element, package: DocxPackage):
+    """Гиперссылки и изображения внутри элемента в порядке следования"""
+    for node in element.iter(W + 'hyperlink', A_BLIP, V_IMAGEDATA):
+        if node.tag == W + 'hyperlink':
+            rid = node.get(R_ID)
+            if rid and rid in package.rels:
+                yield {"type": "hyperlink", "text": _run_text(node), "url": package.rels[rid]}
+        else:
+            rid = node.get(R_EMBED) if node.tag == A_BLIP else node.get(R_ID)
+            name = package.rels.get(rid)
+            if name:
+                yield {"type": "image", "rid": rid, "name": name, "size": package.media_size(name)}
+
+
+def iter_docx(package: DocxPackage):
+    """
+    Один проход iterparse по word/document.xml: параграфы, таблицы, гиперссылки и изображения
+    в порядке документа. Обработанные элементы тела сразу удаляются из дерева,
+    так что память не растёт с размером документа.
+    """
+    with package.zip.open('word/document.xml') as f:
+        body = None
+        for event, elem in etree.iterparse(f, events=('start', 'end')):
+            if event == 'start':
+                if elem.tag == W + 'body':
+                    body = elem
+                continue
+            if body is None or elem.getparent() is not body:
+                continue
+
+            if elem.tag == W + 'p':
+                style = elem.find(f'{W}pPr/{W}pStyle')
+                yield {
+                    "type": "paragraph",
+                    "text": _run_text(elem),
+                    "style": style.get(W + 'val') if style is not None else None,
+                }
+                yield from _inline_refs(elem, package)
+            elif elem.tag == W + 'tbl':
+                rows = [
+                    ['\n'.join(_run_text(p) for p in tc.iter(W + 'p')) for tc in tr.iterchildren(W + 'tc')]
+                    for tr in elem.iterchildren(W + 'tr')
+                ]
+                yield {"type": "table", "rows": rows}
+                yield from _inline_refs(elem, package)
+
+            # Освобождаем обработанный элемент тела
+            body.remove(elem)
+
+
+def extract_docx_single_pass(source) -> dict:
+    """Текст, изображения и гиперссылки за один проход по пакету"""
+    package = DocxPackage(source)
+    try:
+        full_text, images, hyperlinks = [], [], []
+        for item in iter_docx(package):
+            if item["type"] == "paragraph":
+                full_text.append(item["text"])
+            elif item["type"] == "table":
+                for row in item["rows"]:
+                    full_text.extend(row)
+            elif item["type"] == "hyperlink":
+                hyperlinks.append({"text": item["text"], "url": item["url"]})
+            elif item["type"] == "image" and item["name"] not in images:
+                images.append(item["name"])
+        # Медиа, на которые нет ссылок из тела (колонтитулы и т.п.), — в конец списка
+        images.extend(name for name in package.media_names() if name not in images)
+        return {"text": '\n'.join(full_text), "images": images, "hyperlinks": hyperlinks}
+    finally:
+        package.close()
+
+def load_file(file_content: BytesIO) -> Document:
+    return docx.Document(file_content)
+
+def extract_content(doc: Document) -> str:
+    full_text = []
+
+    # Обходим все элементы в документе в порядке их следования
+    for element in doc.element.body:
+        if element.tag.endswith('p'):  # параграф
+            para = docx.text.paragraph.Paragraph(element, doc)
+            full_text.append(para.text)
+        elif element.tag.endswith('tbl'):  # таблица
+            table = docx.table.Table(element, doc)
+            for row in table.rows:
+                for cell in row.cells:
+                    full_text.append(cell.text)
+
+    return '\n'.join(full_text)
+
+def extract_images(doc: Document, file_content: BytesIO) -> list:
+    # Извлекаем изображения из docx (они находятся в папке word/media/)
+    with zipfile.ZipFile(file_content) as docx_zip:
+        image_files = [name for name in docx_zip.namelist() if name.startswith('word/media/')]
+        images_data = []
+        for img in image_files:
+            with docx_zip.open(img) as img_file:
+                images_data.append({
+                    "filename": img,
+                    "data": img_file.read()
+                })
+    return images_data
+
+def extract_hyperlinks(doc: Document) -> list:
+    # Извлечение гиперссылок из документа
+    rels = doc.part.rels
+    hyperlinks = []
+    for rel in rels:
+        rel_target = rels[rel].target_ref
+        if "hyperlink" in rel_target.lower():
+            hyperlinks.append(rel_target)
+    # Более точное извлечение из параграфов
+    links = []
+    for paragraph in doc.paragraphs:
+        links.extend(get_links_from_paragraph(paragraph))
+    return links
+
+def get_links_from_paragraph(paragraph: Paragraph):
+    links = []
+    part = paragraph._element
+    hyperlinks = part.xpath('.//w:hyperlink', namespaces={'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'})
+    for link in hyperlinks:
+        rId = link.get(qn('r:id'))
+        if rId:
+            target = paragraph.part.rels[rId].target_ref
+            text = "".join([t.text for t in link.xpath('.//w:t', namespaces={'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'})])
+            links.append({"text": text, "url": target})
+    return links
+
+def process_docx_job(source) -> dict:
+    """Точка входа в процессе пула: source — байты небольшого файла или путь к временному файлу"""
+    if isinstance(source, bytes):
+        source = BytesIO(source)
+    return extract_docx_single_pass(source)
+
+
+def upload_size(file: UploadFile) -> int:
+    if file.size is not None:
+        return file.size
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
+
+
+def spool_to_disk(file: UploadFile) -> str:
+    """Копирует загрузку в именованный временный файл, который сможет открыть процесс пула"""
+    file.file.seek(0)
+    with tempfile.NamedTemporaryFile(suffix=".docx", delete=False) as tmp:
+        shutil.copyfileobj(file.file, tmp, length=1024 * 1024)
+        return tmp.name
+
+
+@app.post("/process_docx")
+async def process_docx(file: UploadFile = File(...)):
+    global pending_jobs
+    size = upload_size(file)
+    if size > DOCX_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File is larger than {DOCX_MAX_UPLOAD_BYTES} bytes")
+    if pending_jobs >= DOCX_MAX_PENDING:
+        raise HTTPException(status_code=503, detail="Too many documents in progress", headers={"Retry-After": "1"})
+
+    pending_jobs += 1
+    spooled_path = None
+    try:
+        if size > DOCX_SPOOL_THRESHOLD:
+            spooled_path = await asyncio.to_thread(spool_to_disk, file)
+            source = spooled_path
+        else:
+            source = await file.read()
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(executor, process_docx_job, source)
+        except (zipfile.BadZipFile, KeyError, etree.XMLSyntaxError):
+            raise HTTPException(status_code=400, detail="File is not a valid DOCX document")
+    finally:
+        pending_jobs -= 1
+        if spooled_path is not None:
+            os.unlink(spooled_path)
+
+    return JSONResponse({
+        "text": result["text"],
+        "images_count": len(result["images"]),
+        "images": result["images"],
+        "hyperlinks": result["hyperlinks"]
+    })
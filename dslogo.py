@@ -1,28 +1,20 @@
 import cv2
 import numpy as np
 
-import fitz  # PyMuPDF
 import cv2
 import numpy as np
 
+from logo_index import find_peaks
+from raster import rasterizer
+
 def pdf_to_image_original_size(pdf_path):
     """
     Рендерит первую страницу PDF в исходном разрешении (1:1 пиксель/точку).
     Возвращает изображение в формате OpenCV (numpy array).
     """
-    doc = fitz.open(pdf_path)
-    page = doc.load_page(0)  # Первая страница
-
-    # Рендерим с матрицей 1:1 (без масштабирования)
-    mat = fitz.Matrix(1.0, 1.0)  # 1.0 = 72 DPI (стандарт PDF)
-    pix = page.get_pixmap(matrix=mat, alpha=False)
-
-    # Конвертируем в numpy array (OpenCV BGR)
-    img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 3)
-    img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-
-    doc.close()
-    return img
+    # 1.0 = 72 DPI (стандарт PDF); рендер общий и кешируется в raster.py
+    img = rasterizer.render_page(pdf_path, 0, 1.0)
+    return cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
 
 
 def preprocess_logo(logo):
@@ -30,7 +22,7 @@ def preprocess_logo(logo):
     # Дополнительная обработка, если нужно (бинаризация, blur)
     return gray
 
-def find_logo_in_image(image, logos, threshold=0.8):
+def find_logo_in_image(image, logos, threshold=0.8, top_k=10):
     gray_img = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     found_positions = []
 
@@ -40,14 +32,15 @@ def find_logo_in_image(image, logos, threshold=0.8):
 
         # Метод TM_CCOEFF_NORMED обычно лучше всего работает для логотипов
         res = cv2.matchTemplate(gray_img, preprocessed_logo, cv2.TM_CCOEFF_NORMED)
-        loc = np.where(res >= threshold)
+        # Только локальные максимумы, а не каждый пиксель над порогом
+        xs, ys, scores = find_peaks(res, threshold, min(w, h) // 2, top_k)
 
-        for pt in zip(*loc[::-1]):
+        for x, y, score in zip(xs.tolist(), ys.tolist(), scores.tolist()):
             found_positions.append({
                 'logo': logo,
-                'position': pt,
+                'position': (x, y),
                 'size': (w, h),
-                'confidence': res[pt[1], pt[0]]
+                'confidence': score
             })
 
     return found_positions
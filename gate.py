@@ -1,77 +1,1599 @@
 routes_store.py
+import asyncio
+import logging
+import os
+import tempfile
 import yaml
-from typing import Dict
-from pydantic import BaseModel
+from types import MappingProxyType
+from typing import Callable, Iterable, Mapping
+from urllib.parse import urlsplit
+from pydantic import BaseModel, ValidationError, field_validator
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 CONFIG_PATH = Path("config.yaml")
+# Как часто воркер проверяет mtime конфига, чтобы подхватить изменения других воркеров
+POLL_INTERVAL = float(os.getenv("GATEWAY_ROUTES_POLL_INTERVAL", "2"))
+
+def check_upstream_url(url: str | None) -> str | None:
+    """http(s)://хост[:порт][/путь]; битый URL иначе всплыл бы только на запросе или проверке здоровья"""
+    if url is None:
+        return url
+    try:
+        parts = urlsplit(url)
+        parts.port  # некорректный порт тоже ValueError
+    except ValueError as e:
+        raise ValueError(f"Invalid upstream url {url!r}: {e}") from None
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"Upstream url must be http(s)://host[:port], got {url!r}")
+    return url
+
+class Upstream(BaseModel):
+    url: str
+    weight: float = 1.0
+
+    _check_url = field_validator("url")(check_upstream_url)
+
+class HealthCheck(BaseModel):
+    path: str = "/health"
+    interval: float = 5.0
+    timeout: float = 2.0
+    unhealthy_threshold: int = 2
+    healthy_threshold: int = 2
+
+class OutlierDetection(BaseModel):
+    consecutive_errors: int = 5        # подряд 5xx/ошибок соединения до выброса из пула
+    base_ejection_time: float = 30.0   # время выброса, растёт с каждым повторным выбросом
+    max_ejection_percent: float = 50.0 # не выбрасываем больше этой доли пула
+    slow_factor: float = 3.0           # реплика медленнее медианы пула в N раз считается выбросом
+    min_requests: int = 20             # сколько ответов нужно для оценки латентности
+
+class CacheConfig(BaseModel):
+    default_ttl: float = 0.0           # TTL, если апстрим не прислал Cache-Control (0 — только с ревалидацией)
+    max_entries: int = 1000
+    max_bytes: int = 64 * 1024 * 1024  # суммарный размер записей в памяти
+    max_body_bytes: int = 1024 * 1024  # ответы крупнее не кешируются и идут потоком
+    disk_dir: str | None = None        # дисковый уровень для вытесненных из памяти записей
+    disk_max_bytes: int = 512 * 1024 * 1024  # сверх — удаляются файлы, дольше всех не читавшиеся
+    disk_max_age: float = 24 * 3600    # файлы без обращений дольше этого удаляются
+
+class TimeoutConfig(BaseModel):
+    connect: float = 5.0
+    read: float = 30.0     # между байтами ответа, а не на весь ответ — стримы не обрываются
+    write: float = 30.0
+    pool: float = 5.0      # ожидание свободного соединения в общем пуле клиента
+
+class CircuitBreakerConfig(BaseModel):
+    window_size: int = 20                 # сколько последних вызовов оцениваем
+    min_calls: int = 10                   # меньше вызовов в окне — не размыкаем
+    failure_rate_threshold: float = 50.0  # % ошибок (5xx, таймауты, обрывы соединения)
+    slow_call_duration: float = 5.0       # вызов дольше этого считается медленным
+    slow_call_rate_threshold: float = 80.0
+    open_duration: float = 30.0           # сколько отвечаем 503 без похода в апстрим
+    half_open_max_calls: int = 3          # пробных запросов в полуоткрытом состоянии
+
+class RateLimitClass(BaseModel):
+    rate: float                # токенов в секунду на клиента
+    burst: float               # ёмкость корзины
+    max_share: float = 100.0   # % от max_concurrency маршрута, который может занять класс
+    level: int = 0             # чем больше, тем приоритетнее класс
+
+# Заголовок идентификатора клиента шлюза; кеш разделяет по нему ответы и без rate_limit
+DEFAULT_KEY_HEADER = "x-api-key"
+
+class RateLimitConfig(BaseModel):
+    key_header: str = DEFAULT_KEY_HEADER   # идентификатор клиента; без него или не из clients — IP
+    priority_header: str = "x-priority"    # может только понизить класс клиента
+    default_class: str | None = None       # класс неизвестных клиентов; None — самый низкий
+    classes: dict[str, RateLimitClass] = {
+        "interactive": RateLimitClass(rate=10, burst=20, level=1),
+        "batch": RateLimitClass(rate=5, burst=10, max_share=50),
+    }
+    clients: dict[str, str] = {}           # API-ключ → класс; повысить класс можно только здесь
 
 class Route(BaseModel):
     name: str
-    url: str
+    # Путь монтирования под /api, например "hr/v2"; по умолчанию — имя маршрута
+    prefix: str | None = None
+    # Чем заменить совпавший префикс в пути к апстриму (по умолчанию префикс просто отрезается)
+    rewrite: str | None = None
+    # Одиночный апстрим (старый формат) или пул реплик
+    url: str | None = None
+    upstreams: list[Upstream] = []
+    health_check: HealthCheck | None = None
+    outlier_detection: OutlierDetection = OutlierDetection()
+    # Кеш идемпотентных GET включается явно для маршрута
+    cache: CacheConfig | None = None
+    timeouts: TimeoutConfig = TimeoutConfig()
+    max_concurrency: int | None = None    # bulkhead: сверх лимита сразу 503
+    circuit_breaker: CircuitBreakerConfig | None = None
+    rate_limit: RateLimitConfig | None = None
+
+    _check_url = field_validator("url")(check_upstream_url)
+
+    def mount(self) -> str:
+        return (self.prefix if self.prefix is not None else self.name).strip("/")
+
+    def upstream_path(self, remainder: str) -> str:
+        if self.rewrite is None:
+            return remainder
+        rewrite = self.rewrite.strip("/")
+        return f"{rewrite}/{remainder}" if rewrite and remainder else rewrite or remainder
+
+    def members(self) -> list[Upstream]:
+        if self.upstreams:
+            return self.upstreams
+        return [Upstream(url=self.url)] if self.url else []
+
+class RouteBulkUpdate(BaseModel):
+    upsert: list[Route] = []
+    delete: list[str] = []
 
 class RouteStore:
+    """
+    Маршруты хранятся неизменяемым снимком: чтение в proxy идёт без блокировок,
+    изменение собирает новый словарь и атомарно подменяет ссылку.
+    Запись на диск — в отдельном потоке через временный файл и os.replace.
+    """
+
     def __init__(self, config_path: Path = CONFIG_PATH):
         self.config_path = config_path
-        self.routes: Dict[str, str] = {}
+        self.routes: Mapping[str, Route] = MappingProxyType({})
+        self._mtime_ns: int | None = None
+        self._write_lock = asyncio.Lock()
+        self._listeners: list[Callable[[Mapping[str, Route]], None]] = []
         self.load_from_yaml()
 
+    def subscribe(self, listener: Callable[[Mapping[str, Route]], None]):
+        """Вызывается с новым снимком при каждой его замене (и сразу — с текущим)"""
+        self._listeners.append(listener)
+        listener(self.routes)
+
+    def _swap(self, routes: dict[str, Route]):
+        self.routes = MappingProxyType(routes)
+        for listener in self._listeners:
+            listener(self.routes)
+
+    def _stat_mtime(self) -> int | None:
+        try:
+            return self.config_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
     def load_from_yaml(self):
-        if self.config_path.exists():
+        mtime = self._stat_mtime()
+        if mtime is not None:
             with open(self.config_path, "r") as f:
                 data = yaml.safe_load(f) or {}
-                self.routes = {k: v["url"] for k, v in data.get("routes", {}).items()}
+            self._swap({k: Route(name=k, **v) for k, v in data.get("routes", {}).items()})
+        self._mtime_ns = mtime
+
+    def save_to_yaml(self, routes: Mapping[str, Route]):
+        """Атомарная запись: читатели видят либо старый, либо новый файл целиком"""
+        data = {"routes": {
+            k: v.model_dump(exclude={"name"}, exclude_none=True, exclude_defaults=True)
+            for k, v in routes.items()
+        }}
+        directory = self.config_path.parent
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{self.config_path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                yaml.safe_dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.config_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return self._stat_mtime()
 
-    def save_to_yaml(self):
-        data = {"routes": {k: {"url": v} for k, v in self.routes.items()}}
-        with open(self.config_path, "w") as f:
-            yaml.safe_dump(data, f)
+    def refresh_if_changed(self) -> bool:
+        """Перечитывает конфиг, если его изменил кто-то другой (другой воркер, оператор)"""
+        mtime = self._stat_mtime()
+        if mtime == self._mtime_ns:
+            return False
+        try:
+            self.load_from_yaml()
+        except (yaml.YAMLError, ValidationError, TypeError, AttributeError) as e:
+            # Невалидный конфиг не применяем: работаем на последнем корректном снимке.
+            # mtime запоминаем, чтобы не разбирать тот же файл каждый тик; исправление даст новый mtime.
+            logger.error("Config %s rejected, keeping previous routes: %s", self.config_path, e)
+            self._mtime_ns = mtime
+            return False
+        return True
 
-    def get(self, service: str) -> str | None:
+    async def watch(self, interval: float = POLL_INTERVAL):
+        """Фоновый опрос mtime; запускается в lifespan приложения"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.refresh_if_changed)
+            except (OSError, yaml.YAMLError, ValidationError, TypeError) as e:
+                # Файл мог оказаться битым в момент ручной правки — попробуем на следующем тике
+                logger.warning("Config reload failed, retrying: %s", e)
+                continue
+
+    def get(self, service: str) -> Route | None:
         return self.routes.get(service)
 
-    def set(self, name: str, url: str):
-        self.routes[name] = url
-        self.save_to_yaml()
+    async def update(self, upsert: Mapping[str, Route] | None = None, delete: Iterable[str] = ()):
+        """Пакетное изменение маршрутов одной записью на диск"""
+        async with self._write_lock:
+            # Сначала подтягиваем чужие изменения, чтобы не затереть их своей записью
+            await asyncio.to_thread(self.refresh_if_changed)
+            routes = dict(self.routes)
+            routes.update(upsert or {})
+            for name in delete:
+                routes.pop(name, None)
+            if routes == self.routes:
+                return
+            self._mtime_ns = await asyncio.to_thread(self.save_to_yaml, routes)
+            self._swap(routes)
 
-    def delete(self, name: str):
-      if name in self.routes:
-          del self.routes[name]
-          self.save_to_yaml()
+    async def set(self, route: Route):
+        await self.update(upsert={route.name: route})
 
-    def all(self):
+    async def delete(self, name: str):
+        await self.update(delete=[name])
+
+    def all_routes(self) -> Mapping[str, Route]:
         return self.routes
 
+    def all(self):
+        """
+        Для GET /admin/routes: маршрут только с url — по-прежнему строкой {name: url},
+        остальные — словарём без значений по умолчанию, как в config.yaml.
+        """
+        result = {}
+        for k, v in self.routes.items():
+            data = v.model_dump(exclude={"name"}, exclude_none=True, exclude_defaults=True)
+            result[k] = data["url"] if data.keys() == {"url"} else data
+        return result
+
 store = RouteStore()
 
 
+route_table.py
+from typing import Mapping
+from routes_store import Route, store
+
+
+class RouteTable:
+    """
+    Маршруты, скомпилированные в префиксное дерево по сегментам пути.
+    Поиск — O(числа сегментов) без регулярок; дерево пересобирается целиком
+    при каждой смене снимка в store и подменяется одной ссылкой.
+    """
+
+    def __init__(self):
+        # Узел: [дочерние узлы по сегменту, маршрут, смонтированный в этом узле]
+        self.root: list = [{}, None]
+
+    @staticmethod
+    def compile(routes: Mapping[str, Route]) -> list:
+        root = [{}, None]
+        for route in routes.values():
+            node = root
+            mount = route.mount()
+            for segment in mount.split("/") if mount else ():
+                node = node[0].setdefault(segment, [{}, None])
+            node[1] = route
+        return root
+
+    def rebuild(self, routes: Mapping[str, Route]):
+        self.root = self.compile(routes)
+
+    def match(self, path: str) -> tuple[Route, str] | None:
+        """Самый длинный смонтированный префикс пути и остаток пути после него"""
+        node = self.root
+        best = (node[1], path) if node[1] is not None else None
+        pos, length = 0, len(path)
+        while pos < length:
+            end = path.find("/", pos)
+            if end == -1:
+                end = length
+            node = node[0].get(path[pos:end])
+            if node is None:
+                break
+            pos = end + 1
+            if node[1] is not None:
+                best = (node[1], path[pos:])
+        return best
+
+    def conflicts(self, route: Route) -> Route | None:
+        """Другой маршрут, уже смонтированный на тот же префикс"""
+        node = self.root
+        mount = route.mount()
+        for segment in mount.split("/") if mount else ():
+            node = node[0].get(segment)
+            if node is None:
+                return None
+        return node[1] if node[1] is not None and node[1].name != route.name else None
+
+
+route_table = RouteTable()
+store.subscribe(route_table.rebuild)
+
+
+upstreams.py
+import asyncio
+import logging
+import random
+import statistics
+import time
+import httpx
+from routes_store import Route, Upstream
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamState:
+    """Рантайм-состояние одной реплики: активные запросы, здоровье, выброс"""
+
+    def __init__(self, upstream: Upstream):
+        self.url = upstream.url.rstrip("/")
+        self.weight = upstream.weight
+        self.outstanding = 0
+        self.healthy = True
+        self.health_streak = 0          # >0 — подряд успешных проверок, <0 — подряд неуспешных
+        self.next_check_at = 0.0
+        self.consecutive_errors = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+        self.latency_ewma: float | None = None
+        self.responses = 0
+
+    def available(self, now: float) -> bool:
+        return self.healthy and self.weight > 0 and now >= self.ejected_until
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        return {
+            "url": self.url,
+            "weight": self.weight,
+            "outstanding": self.outstanding,
+            "healthy": self.healthy,
+            "ejected_for_s": round(max(self.ejected_until - now, 0), 1),
+            "latency_ewma_s": self.latency_ewma,
+        }
+
+
+class UpstreamPool:
+    """Пул реплик маршрута с балансировкой least-outstanding-requests"""
+
+    EWMA_ALPHA = 0.2
+
+    def __init__(self, route: Route, previous: "UpstreamPool | None" = None):
+        self.route = route
+        old = {m.url: m for m in previous.members} if previous else {}
+        self.members: list[UpstreamState] = []
+        for upstream in route.members():
+            state = old.get(upstream.url.rstrip("/")) or UpstreamState(upstream)
+            state.weight = upstream.weight
+            self.members.append(state)
+
+    def pick(self) -> UpstreamState | None:
+        """Реплика с минимумом активных запросов на единицу веса; ничьи — случайно"""
+        now = time.monotonic()
+        best, best_score, ties = None, None, 0
+        for member in self.members:
+            if not member.available(now):
+                continue
+            score = (member.outstanding + 1) / member.weight
+            if best is None or score < best_score:
+                best, best_score, ties = member, score, 1
+            elif score == best_score:
+                ties += 1
+                if random.randrange(ties) == 0:
+                    best = member
+        if best is not None:
+            best.outstanding += 1
+        return best
+
+    def release(self, member: UpstreamState):
+        member.outstanding -= 1
+
+    def observe(self, member: UpstreamState, ok: bool, latency: float):
+        """Пассивная проверка: ошибки подряд и хроническая медленность выбрасывают реплику"""
+        outlier = self.route.outlier_detection
+        member.responses += 1
+        if member.latency_ewma is None:
+            member.latency_ewma = latency
+        else:
+            member.latency_ewma += self.EWMA_ALPHA * (latency - member.latency_ewma)
+
+        if ok:
+            member.consecutive_errors = 0
+        else:
+            member.consecutive_errors += 1
+            if member.consecutive_errors >= outlier.consecutive_errors:
+                self._eject(member)
+                return
+
+        if member.responses >= outlier.min_requests and len(self.members) > 1:
+            peers = [
+                m.latency_ewma for m in self.members
+                if m is not member and m.latency_ewma is not None and m.responses >= outlier.min_requests
+            ]
+            if peers and member.latency_ewma > outlier.slow_factor * statistics.median(peers):
+                self._eject(member)
+
+    def _eject(self, member: UpstreamState):
+        now = time.monotonic()
+        outlier = self.route.outlier_detection
+        ejected = sum(1 for m in self.members if m.ejected_until > now)
+        if (ejected + 1) * 100 > outlier.max_ejection_percent * len(self.members):
+            return
+        member.ejections += 1
+        member.ejected_until = now + outlier.base_ejection_time * member.ejections
+        member.consecutive_errors = 0
+        # После возврата реплика заново набирает статистику латентности
+        member.latency_ewma = None
+        member.responses = 0
+
+    def status(self) -> list[dict]:
+        return [m.status() for m in self.members]
+
+
+class PoolRegistry:
+    """Пулы по маршрутам; пересобираются лениво, когда меняется снимок маршрута в store"""
+
+    def __init__(self):
+        self.pools: dict[str, UpstreamPool] = {}
+
+    def get(self, route: Route) -> UpstreamPool:
+        pool = self.pools.get(route.name)
+        if pool is None or pool.route is not route:
+            pool = UpstreamPool(route, previous=pool)
+            self.pools[route.name] = pool
+        return pool
+
+    async def _probe(self, client: httpx.AsyncClient, member: UpstreamState, check):
+        try:
+            resp = await client.get(f"{member.url}{check.path}", timeout=check.timeout)
+            ok = resp.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        except Exception as e:
+            # Например, httpx.InvalidURL — не наследник HTTPError; реплика считается больной, цикл живёт
+            logger.warning("Health check of %s failed: %r", member.url, e)
+            ok = False
+        if ok:
+            member.health_streak = max(member.health_streak, 0) + 1
+            if member.health_streak >= check.healthy_threshold:
+                member.healthy = True
+        else:
+            member.health_streak = min(member.health_streak, 0) - 1
+            if -member.health_streak >= check.unhealthy_threshold:
+                member.healthy = False
+
+    async def run_health_checks(self, client: httpx.AsyncClient, routes, tick: float = 1.0):
+        """Активные проверки для маршрутов с health_check; routes — callable, отдающий снимок"""
+        while True:
+            now = time.monotonic()
+            probes = []
+            for route in routes().values():
+                pool = self.get(route)
+                check = route.health_check
+                for member in pool.members:
+                    if check is None:
+                        member.healthy = True
+                        continue
+                    if now >= member.next_check_at:
+                        member.next_check_at = now + check.interval
+                        probes.append(self._probe(client, member, check))
+            if probes:
+                # Одна сломанная проверка не должна остановить проверки всех маршрутов
+                for result in await asyncio.gather(*probes, return_exceptions=True):
+                    if isinstance(result, Exception):
+                        logger.error("Health check crashed: %r", result)
+            await asyncio.sleep(tick)
+
+
+pools = PoolRegistry()
+
+
+cache.py
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from routes_store import CacheConfig
+
+MAX_AGE_RE = re.compile(r"(?:^|,)\s*(s-maxage|max-age)\s*=\s*\"?(\d+)")
+# Заголовки запроса, входящие в ключ кеша; Vary по любому другому делает ответ некешируемым
+CACHE_KEY_HEADERS = ("accept", "accept-encoding")
+# Как часто (не чаще) чистим дисковый уровень при записи на него
+DISK_SWEEP_INTERVAL = 60.0
+
+
+@dataclass
+class CacheEntry:
+    status_code: int
+    headers: list                 # сырые (bytes, bytes) заголовки без hop-by-hop
+    body: bytes
+    expires_at: float             # time.time(), чтобы запись с диска была валидна в любом воркере
+    etag: str | None = None
+    last_modified: str | None = None
+    stored_at: float = field(default_factory=time.time)
+
+    def fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+    def conditional_headers(self) -> list:
+        headers = []
+        if self.etag:
+            headers.append((b"if-none-match", self.etag.encode("latin-1")))
+        if self.last_modified:
+            headers.append((b"if-modified-since", self.last_modified.encode("latin-1")))
+        return headers
+
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers)
+
+    def to_bytes(self) -> bytes:
+        meta = {
+            "status_code": self.status_code,
+            "headers": [[k.decode("latin-1"), v.decode("latin-1")] for k, v in self.headers],
+            "expires_at": self.expires_at,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "stored_at": self.stored_at,
+        }
+        return json.dumps(meta).encode() + b"\n" + self.body
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CacheEntry":
+        meta_raw, body = data.split(b"\n", 1)
+        meta = json.loads(meta_raw)
+        meta["headers"] = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in meta["headers"]]
+        return cls(body=body, **meta)
+
+
+def response_ttl(headers, default_ttl: float) -> float | None:
+    """TTL по Cache-Control ответа; None — ответ кешировать нельзя"""
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-store" in cache_control or "private" in cache_control:
+        return None
+    if "set-cookie" in headers:
+        # Сессия одного клиента не должна уехать остальным из кеша
+        return None
+    vary = {token.strip().lower() for token in headers.get("vary", "").split(",")} - {""}
+    if vary - set(CACHE_KEY_HEADERS):
+        # "*" или заголовок вне ключа: разные клиенты получили бы один и тот же вариант
+        return None
+    if "no-cache" in cache_control:
+        return 0.0
+    ages = dict(MAX_AGE_RE.findall(cache_control))
+    if "s-maxage" in ages:
+        return float(ages["s-maxage"])
+    if "max-age" in ages:
+        return float(ages["max-age"])
+    return default_ttl
+
+
+class RouteCache:
+    """
+    LRU в памяти с опциональным дисковым уровнем: вытесненные из памяти записи
+    уходят на диск (шардированные каталоги, атомарная запись) и поднимаются обратно при попадании.
+    """
+
+    def __init__(self, config: CacheConfig):
+        self.config = config
+        self.entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self.bytes = 0
+        self.inflight: dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "collapsed": 0, "stored": 0, "bypass": 0}
+        self.disk_dir = Path(config.disk_dir) if config.disk_dir else None
+        self._last_sweep = 0.0
+
+    def hit_ratio(self) -> float:
+        """Доля запросов, обслуженных без похода в апстрим (склеенные промахи тоже считаются)"""
+        served = self.stats["hits"] + self.stats["collapsed"]
+        lookups = served + self.stats["misses"] + self.stats["revalidated"]
+        return served / lookups if lookups else 0.0
+
+    def _disk_path(self, key: str) -> Path:
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        return self.disk_dir / digest[:2] / digest
+
+    def _read_disk(self, key: str) -> CacheEntry | None:
+        path = self._disk_path(key)
+        try:
+            entry = CacheEntry.from_bytes(path.read_bytes())
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, TypeError):
+            path.unlink(missing_ok=True)
+            return None
+        if not entry.fresh() and not entry.conditional_headers():
+            # Протухла и ревалидировать нечем — файл больше не нужен
+            path.unlink(missing_ok=True)
+            return None
+        # mtime — время последнего обращения, по нему чистит _sweep_disk
+        os.utime(path)
+        return entry
+
+    def _write_disk(self, key: str, entry: CacheEntry):
+        path = self._disk_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(entry.to_bytes())
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+    def _sweep_disk(self):
+        """Удаляет файлы без обращений дольше disk_max_age, затем самые старые — до disk_max_bytes"""
+        now = time.time()
+        files = []
+        for path in self.disk_dir.glob("*/*"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            if now - st.st_mtime > self.config.disk_max_age:
+                path.unlink(missing_ok=True)
+            elif not path.name.endswith(".tmp"):
+                files.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.config.disk_max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def _spill_to_disk(self, spilled: list):
+        """Вытесненные из памяти записи — на диск, если их ещё можно отдать или ревалидировать"""
+        for key, entry in spilled:
+            if entry.fresh() or entry.conditional_headers():
+                self._write_disk(key, entry)
+        if time.monotonic() - self._last_sweep >= DISK_SWEEP_INTERVAL:
+            self._last_sweep = time.monotonic()
+            self._sweep_disk()
+
+    async def get(self, key: str) -> CacheEntry | None:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            return entry
+        if self.disk_dir is None:
+            return None
+        entry = await asyncio.to_thread(self._read_disk, key)
+        if entry is not None:
+            # Подъём с диска тоже вытесняет записи из памяти — их не теряем
+            spilled = self._put_memory(key, entry)
+            if spilled:
+                await asyncio.to_thread(self._spill_to_disk, spilled)
+        return entry
+
+    async def put(self, key: str, entry: CacheEntry):
+        self.stats["stored"] += 1
+        spilled = self._put_memory(key, entry)
+        if self.disk_dir is not None and spilled:
+            await asyncio.to_thread(self._spill_to_disk, spilled)
+
+    def _put_memory(self, key: str, entry: CacheEntry) -> list:
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old.size()
+        self.entries[key] = entry
+        self.bytes += entry.size()
+        spilled = []
+        while self.entries and (len(self.entries) > self.config.max_entries or self.bytes > self.config.max_bytes):
+            evicted_key, evicted = self.entries.popitem(last=False)
+            self.bytes -= evicted.size()
+            spilled.append((evicted_key, evicted))
+        return spilled
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+
+class ResponseCache:
+    """Кеши по маршрутам; пересоздаются, если у маршрута поменялись настройки кеша"""
+
+    def __init__(self):
+        self.routes: dict[str, RouteCache] = {}
+
+    def get(self, name: str, config: CacheConfig) -> RouteCache:
+        route_cache = self.routes.get(name)
+        if route_cache is None or route_cache.config != config:
+            route_cache = RouteCache(config)
+            self.routes[name] = route_cache
+        return route_cache
+
+    def status(self) -> dict:
+        return {
+            name: {**c.stats, "hit_ratio": round(c.hit_ratio(), 4), "entries": len(c.entries), "bytes": c.bytes}
+            for name, c in self.routes.items()
+        }
+
+
+response_cache = ResponseCache()
+
+
+resilience.py
+import math
+import time
+from collections import deque
+from routes_store import Route, CircuitBreakerConfig
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    """
+    Размыкатель по доле ошибок и медленных вызовов в скользящем окне последних вызовов.
+    Счётчики окна поддерживаются инкрементально — проверка O(1) на запрос.
+    """
+
+    def __init__(self, config: CircuitBreakerConfig):
+        self.config = config
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.window: deque = deque()
+        self.failures = 0
+        self.slow = 0
+        self.half_open_calls = 0
+        self.half_open_successes = 0
+
+    def retry_after(self) -> float:
+        return max(self.opened_at + self.config.open_duration - time.monotonic(), 0.0)
+
+    def allow(self) -> bool:
+        if self.state == OPEN:
+            if self.retry_after() > 0:
+                return False
+            self.state = HALF_OPEN
+            self.half_open_calls = 0
+            self.half_open_successes = 0
+        if self.state == HALF_OPEN:
+            if self.half_open_calls >= self.config.half_open_max_calls:
+                return False
+            self.half_open_calls += 1
+        return True
+
+    def cancel(self):
+        """Разрешённый вызов так и не дошёл до апстрима — возвращаем пробный слот"""
+        if self.state == HALF_OPEN and self.half_open_calls > 0:
+            self.half_open_calls -= 1
+
+    def record(self, ok: bool, latency: float):
+        slow = latency >= self.config.slow_call_duration
+        if self.state == HALF_OPEN:
+            if not ok or slow:
+                self._open()
+                return
+            self.half_open_successes += 1
+            if self.half_open_successes >= self.config.half_open_max_calls:
+                self._close()
+            return
+        if self.state == OPEN:
+            return
+
+        self.window.append((ok, slow))
+        self.failures += not ok
+        self.slow += slow
+        if len(self.window) > self.config.window_size:
+            old_ok, old_slow = self.window.popleft()
+            self.failures -= not old_ok
+            self.slow -= old_slow
+        calls = len(self.window)
+        if calls >= self.config.min_calls and (
+            self.failures * 100 >= self.config.failure_rate_threshold * calls
+            or self.slow * 100 >= self.config.slow_call_rate_threshold * calls
+        ):
+            self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+
+    def _close(self):
+        self.state = CLOSED
+        self.window.clear()
+        self.failures = self.slow = 0
+
+
+class RouteGuard:
+    """Bulkhead и размыкатель одного маршрута"""
+
+    def __init__(self, route: Route):
+        self.max_concurrency = route.max_concurrency
+        self.breaker_config = route.circuit_breaker
+        self.breaker = CircuitBreaker(route.circuit_breaker) if route.circuit_breaker else None
+        self.in_flight = 0
+        self.rejected = 0
+
+    def try_acquire(self, max_share: float = 100.0) -> bool:
+        """Низкоприоритетным классам доступна только доля слотов — остальное резерв для интерактивных"""
+        if self.max_concurrency is not None:
+            limit = math.ceil(self.max_concurrency * max_share / 100)
+            if self.in_flight >= limit:
+                self.rejected += 1
+                return False
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+
+    def status(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "rejected": self.rejected,
+            "circuit": self.breaker.state if self.breaker else None,
+        }
+
+
+class GuardRegistry:
+    def __init__(self):
+        self.guards: dict[str, RouteGuard] = {}
+
+    def get(self, route: Route) -> RouteGuard:
+        guard = self.guards.get(route.name)
+        if guard is None or guard.max_concurrency != route.max_concurrency \
+                or guard.breaker_config != route.circuit_breaker:
+            guard = RouteGuard(route)
+            self.guards[route.name] = guard
+        return guard
+
+
+guards = GuardRegistry()
+
+
+ratelimit.py
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import time
+from collections import OrderedDict
+from routes_store import Route, RateLimitConfig, RateLimitClass
+
+# memory — корзины в памяти воркера; file — общая mmap-таблица для всех воркеров uvicorn
+BACKEND = os.getenv("GATEWAY_RATELIMIT_BACKEND", "file")
+STATE_PATH = os.getenv("GATEWAY_RATELIMIT_PATH", "/tmp/gateway_ratelimit.bin")
+SLOTS = int(os.getenv("GATEWAY_RATELIMIT_SLOTS", "65536"))
+
+
+def bucket_key(*parts: str) -> int:
+    """64-битный ненулевой хеш ключа корзины (0 — признак пустого слота)"""
+    digest = hashlib.blake2b("\x00".join(parts).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+def refill(tokens: float, last: float, now: float, limit: RateLimitClass) -> float:
+    return min(limit.burst, tokens + (now - last) * limit.rate)
+
+
+class MemoryBuckets:
+    """Корзины в памяти процесса; LRU-ограничение на число клиентов"""
+
+    def __init__(self, max_keys: int = SLOTS):
+        self.max_keys = max_keys
+        self.buckets: OrderedDict[int, list] = OrderedDict()
+
+    def take(self, key: int, limit: RateLimitClass) -> float:
+        """Списывает токен; возвращает 0, если можно пропустить, иначе сколько секунд ждать"""
+        now = time.time()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = [limit.burst, now]
+            self.buckets[key] = bucket
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        tokens = refill(bucket[0], bucket[1], now, limit)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return 0.0
+        bucket[0] = tokens
+        return (1 - tokens) / limit.rate
+
+
+class FileBuckets:
+    """
+    Общая для воркеров таблица корзин в mmap-файле: слот = (ключ u64, токены f64, время f64).
+    Открытая адресация на PROBES слотов, блокировка fcntl только на диапазон этих слотов.
+    """
+
+    SLOT = struct.Struct("<Qdd")
+    PROBES = 4
+
+    def __init__(self, path: str = STATE_PATH, slots: int = SLOTS):
+        self.slots = slots
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = self.SLOT.size * slots
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)
+        self.mm = mmap.mmap(self.fd, size)
+
+    def take(self, key: int, limit: RateLimitClass) -> float:
+        start = key % (self.slots - self.PROBES + 1)
+        offset = start * self.SLOT.size
+        length = self.PROBES * self.SLOT.size
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, length, offset)
+        try:
+            now = time.time()
+            slot, victim, victim_last = None, None, math.inf
+            for i in range(self.PROBES):
+                pos = offset + i * self.SLOT.size
+                slot_key, tokens, last = self.SLOT.unpack_from(self.mm, pos)
+                if slot_key == key:
+                    slot = pos
+                    break
+                if slot_key == 0 or last < victim_last:
+                    # Пустой слот или самый давно не использованный — кандидат на вытеснение
+                    victim, victim_last = pos, (-math.inf if slot_key == 0 else last)
+            if slot is None:
+                slot, tokens, last = victim, limit.burst, now
+            tokens = refill(tokens, last, now, limit)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / limit.rate
+            self.SLOT.pack_into(self.mm, slot, key, tokens, now)
+            return wait
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, length, offset)
+
+
+class RateLimiter:
+    def __init__(self, backend: str = BACKEND):
+        self.backend = backend
+        self._buckets = None
+
+    @property
+    def buckets(self):
+        # Файл открываем лениво — уже в воркере, а не в мастер-процессе
+        if self._buckets is None:
+            self._buckets = FileBuckets() if self.backend == "file" else MemoryBuckets()
+        return self._buckets
+
+    @staticmethod
+    def classify(config: RateLimitConfig, request) -> tuple[str, str]:
+        """Идентичность клиента и его класс приоритета"""
+        api_key = request.headers.get(config.key_header)
+        # Своя корзина только у известных ключей: иначе ротация заголовка давала бы полную корзину на каждый запрос
+        if api_key and api_key in config.clients:
+            identity = f"key:{api_key}"
+        else:
+            identity = f"ip:{request.client.host if request.client else '-'}"
+        priority = config.clients.get(api_key) if api_key else None
+        if priority not in config.classes:
+            priority = config.default_class
+        if priority not in config.classes:
+            priority = min(config.classes, key=lambda name: config.classes[name].level)
+        # Заголовок доверия не требует, поэтому им можно только уступить, но не повысить класс
+        requested = request.headers.get(config.priority_header)
+        if requested in config.classes and config.classes[requested].level < config.classes[priority].level:
+            priority = requested
+        return identity, priority
+
+    def admit(self, route: Route, request) -> tuple[float, RateLimitClass | None]:
+        """(секунд до следующей попытки или 0, параметры класса клиента)"""
+        config = route.rate_limit
+        if config is None:
+            return 0.0, None
+        identity, priority = self.classify(config, request)
+        limit = config.classes[priority]
+        return self.buckets.take(bucket_key(route.name, priority, identity), limit), limit
+
+
+rate_limiter = RateLimiter()
+
+
+metrics.py
+import os
+import time
+import uuid
+from collections import defaultdict
+
+TRACE_HEADER = os.getenv("GATEWAY_TRACE_HEADER", "x-request-id")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+# Бюджет накладных расходов инструментирования на запрос (проверяется bench_metrics.py)
+OVERHEAD_BUDGET_US = 20.0
+
+
+class Histogram:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                return
+
+
+class RouteMetrics:
+    __slots__ = ("statuses", "latency", "upstream_latency", "bytes_in", "bytes_out")
+
+    def __init__(self):
+        self.statuses = defaultdict(int)
+        self.latency = Histogram()            # от входа в proxy до заголовков ответа
+        self.upstream_latency = Histogram()   # от отправки в апстрим до его заголовков
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+
+class GatewayMetrics:
+    def __init__(self):
+        self.routes: dict[str, RouteMetrics] = defaultdict(RouteMetrics)
+        self.started_at = time.time()
+
+    def route(self, name: str) -> RouteMetrics:
+        return self.routes[name]
+
+    @staticmethod
+    def trace_id(headers) -> str:
+        """Берём id трассировки клиента или генерируем новый"""
+        return headers.get(TRACE_HEADER) or uuid.uuid4().hex
+
+    async def count_stream(self, chunks, route: RouteMetrics, attr: str):
+        async for chunk in chunks:
+            setattr(route, attr, getattr(route, attr) + len(chunk))
+            yield chunk
+
+    @staticmethod
+    def pool_stats(client) -> dict:
+        """Состояние пула соединений httpx (через httpcore, без публичного API — best effort)"""
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        if pool is None:
+            return {}
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for c in connections if c.is_idle())
+        return {
+            "connections": len(connections),
+            "idle": idle,
+            "active": len(connections) - idle,
+            "waiting_requests": sum(1 for r in getattr(pool, "_requests", []) if getattr(r, "connection", None) is None),
+            "max_connections": getattr(pool, "_max_connections", None),
+        }
+
+    def render(self, client=None, pools=None, guards=None, caches=None) -> str:
+        """Текстовый формат Prometheus; строки одного семейства метрик идут одной группой"""
+        families: dict[str, tuple[str, list]] = {}
+
+        def add(family: str, kind: str, line: str):
+            families.setdefault(family, (kind, []))[1].append(line)
+
+        for name, m in self.routes.items():
+            label = f'route="{name}"'
+            for code, count in m.statuses.items():
+                add("gateway_requests_total", "counter", f'gateway_requests_total{{{label},code="{code}"}} {count}')
+            for metric, hist in (("gateway_request_duration_seconds", m.latency),
+                                 ("gateway_upstream_duration_seconds", m.upstream_latency)):
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, hist.buckets):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else bound
+                    add(metric, "histogram", f'{metric}_bucket{{{label},le="{le}"}} {cumulative}')
+                add(metric, "histogram", f"{metric}_sum{{{label}}} {hist.sum}")
+                add(metric, "histogram", f"{metric}_count{{{label}}} {hist.count}")
+            add("gateway_request_bytes_total", "counter", f"gateway_request_bytes_total{{{label}}} {m.bytes_in}")
+            add("gateway_response_bytes_total", "counter", f"gateway_response_bytes_total{{{label}}} {m.bytes_out}")
+
+        if client is not None:
+            for key, value in self.pool_stats(client).items():
+                if value is not None:
+                    add("gateway_http_pool", "gauge", f'gateway_http_pool{{state="{key}"}} {value}')
+        if pools is not None:
+            now = time.monotonic()
+            for name, pool in pools.pools.items():
+                for member in pool.members:
+                    label = f'route="{name}",upstream="{member.url}"'
+                    add("gateway_upstream_outstanding", "gauge", f"gateway_upstream_outstanding{{{label}}} {member.outstanding}")
+                    add("gateway_upstream_available", "gauge", f"gateway_upstream_available{{{label}}} {int(member.available(now))}")
+        if guards is not None:
+            for name, guard in guards.guards.items():
+                add("gateway_route_in_flight", "gauge", f'gateway_route_in_flight{{route="{name}"}} {guard.in_flight}')
+                if guard.breaker is not None:
+                    add("gateway_circuit_open", "gauge",
+                        f'gateway_circuit_open{{route="{name}"}} {int(guard.breaker.state != "closed")}')
+        if caches is not None:
+            for name, cache in caches.routes.items():
+                for event, count in cache.stats.items():
+                    add("gateway_cache_events_total", "counter",
+                        f'gateway_cache_events_total{{route="{name}",event="{event}"}} {count}')
+                add("gateway_cache_hit_ratio", "gauge", f'gateway_cache_hit_ratio{{route="{name}"}} {cache.hit_ratio()}')
+
+        lines = []
+        for family, (kind, samples) in families.items():
+            lines.append(f"# TYPE {family} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+gateway_metrics = GatewayMetrics()
+
+
+bench_metrics.py
+import time
+from metrics import GatewayMetrics, OVERHEAD_BUDGET_US
+
+
+def main(iterations: int = 200_000):
+    """Стоимость инструментирования одного запроса: trace id, счётчики, две гистограммы, байты"""
+    metrics = GatewayMetrics()
+    headers = {}
+    started = time.perf_counter()
+    for i in range(iterations):
+        metrics.trace_id(headers)
+        m = metrics.route("svc")
+        m.statuses[200] += 1
+        m.latency.observe(0.012)
+        m.upstream_latency.observe(0.010)
+        m.bytes_out += 1024
+    per_request_us = (time.perf_counter() - started) / iterations * 1e6
+    print(f"Инструментирование: {per_request_us:.2f} мкс/запрос (бюджет {OVERHEAD_BUDGET_US} мкс)")
+    if per_request_us > OVERHEAD_BUDGET_US:
+        raise SystemExit("Бюджет накладных расходов превышен")
+
+
+if __name__ == "__main__":
+    main()
+
+
 admin_routes.py
-from fastapi import APIRouter
-from routes_store import store, Route
+from fastapi import APIRouter, HTTPException
+from routes_store import store, Route, RouteBulkUpdate, Upstream
+from upstreams import pools
+from cache import response_cache
+from resilience import guards
+from route_table import route_table
 
 admin_router = APIRouter(prefix="/admin", tags=["Admin"])
 
+def validate_route(route: Route):
+    if not route.members():
+        raise HTTPException(status_code=422, detail=f"Route {route.name} has no url or upstreams")
+    other = route_table.conflicts(route)
+    if other is not None:
+        raise HTTPException(status_code=409, detail=f"Prefix /{route.mount()} is already mounted by {other.name}")
+
 @admin_router.get("/routes")
 def get_routes():
     return store.all()
 
 @admin_router.post("/routes")
-def add_route(route: Route):
-    store.set(route.name, route.url)
+async def add_route(route: Route):
+    validate_route(route)
+    await store.set(route)
+    return {"status": "ok", "routes": store.all()}
+
+@admin_router.post("/routes/bulk")
+async def bulk_update_routes(update: RouteBulkUpdate):
+    for route in update.upsert:
+        validate_route(route)
+    await store.update(upsert={r.name: r for r in update.upsert}, delete=update.delete)
     return {"status": "ok", "routes": store.all()}
 
 @admin_router.delete("/routes/{name}")
-def delete_route(name: str):
-    store.delete(name)
+async def delete_route(name: str):
+    await store.delete(name)
     return {"status": "deleted", "routes": store.all()}
 
+@admin_router.get("/guards")
+def get_guards():
+    return {name: guard.status() for name, guard in guards.guards.items()}
 
-main.py
+@admin_router.get("/cache")
+def get_cache_stats():
+    return response_cache.status()
+
+@admin_router.delete("/cache/{name}")
+def purge_cache(name: str):
+    route_cache = response_cache.routes.get(name)
+    if route_cache is not None:
+        route_cache.clear()
+    return {"status": "purged"}
+
+def get_route_or_404(name: str) -> Route:
+    route = store.get(name)
+    if route is None:
+        raise HTTPException(status_code=404, detail=f"Unknown route: {name}")
+    return route
+
+@admin_router.get("/routes/{name}/upstreams")
+def get_upstreams(name: str):
+    return pools.get(get_route_or_404(name)).status()
+
+@admin_router.post("/routes/{name}/upstreams")
+async def add_upstream(name: str, upstream: Upstream):
+    """Добавляет реплику в пул или меняет её вес"""
+    route = get_route_or_404(name)
+    members = [m for m in route.members() if m.url != upstream.url] + [upstream]
+    await store.set(route.model_copy(update={"url": None, "upstreams": members}))
+    return {"status": "ok", "upstreams": pools.get(store.get(name)).status()}
+
+@admin_router.delete("/routes/{name}/upstreams")
+async def delete_upstream(name: str, url: str):
+    route = get_route_or_404(name)
+    members = [m for m in route.members() if m.url != url]
+    if not members:
+        raise HTTPException(status_code=409, detail="Cannot remove the last upstream; delete the route instead")
+    await store.set(route.model_copy(update={"url": None, "upstreams": members}))
+    return {"status": "deleted", "upstreams": pools.get(store.get(name)).status()}
+
+
+http_client.py
+import os
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+import httpx
+
+
+class NoCookiesPolicy(DefaultCookiePolicy):
+    """Клиент общий для всех вызывающих: Set-Cookie апстрима не должен уйти чужому запросу"""
+
+    def set_ok(self, cookie, request):
+        return False
+
+    def return_ok(self, cookie, request):
+        return False
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Один пул соединений на всё время жизни приложения — keep-alive к апстримам
+    вместо нового TCP/TLS-рукопожатия на каждый проксируемый запрос.
+    Параметры пула задаются переменными окружения.
+    """
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("GATEWAY_MAX_CONNECTIONS", "200")),
+        max_keepalive_connections=int(os.getenv("GATEWAY_MAX_KEEPALIVE", "50")),
+        keepalive_expiry=float(os.getenv("GATEWAY_KEEPALIVE_EXPIRY", "30")),
+    )
+    # HTTP/2 требует пакет h2 (pip install httpx[http2])
+    http2 = os.getenv("GATEWAY_HTTP2", "0") == "1"
+    # Куки не запоминаем: Set-Cookie просто проксируется вызывающему как заголовок
+    cookies = CookieJar(policy=NoCookiesPolicy())
+    return httpx.AsyncClient(limits=limits, http2=http2, cookies=cookies)
+
+
+bench_routes.py
+import argparse
+import random
+import re
+import time
+from routes_store import Route
+from route_table import RouteTable
+
+
+def make_routes(n: int) -> dict[str, Route]:
+    """n маршрутов вида svcK[/vM[/area]] — вложенные версии и разделы"""
+    routes = {}
+    for i in range(n):
+        service = f"svc{i // 10}"
+        depth = i % 10
+        prefix = service if depth == 0 else f"{service}/v{depth}" if depth < 5 else f"{service}/v{depth}/area{depth}"
+        name = prefix.replace("/", "-")
+        routes[name] = Route(name=name, prefix=prefix, url=f"http://127.0.0.1:{9000 + i % 100}")
+    return routes
+
+
+def regex_matcher(routes: dict[str, Route]):
+    """Наивный вариант для сравнения: перебор регулярок от длинного префикса к короткому"""
+    compiled = sorted(
+        ((re.compile(rf"^{re.escape(r.mount())}(?:/(.*))?$"), r) for r in routes.values()),
+        key=lambda item: -len(item[1].mount())
+    )
+
+    def match(path: str):
+        for pattern, route in compiled:
+            m = pattern.match(path)
+            if m:
+                return route, m.group(1) or ""
+        return None
+    return match
+
+
+def bench(fn, paths, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for p in paths:
+            fn(p)
+    return (time.perf_counter() - started) / (repeat * len(paths)) * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарк поиска маршрута по префиксному дереву")
+    parser.add_argument("--routes", type=int, default=10_000)
+    parser.add_argument("--lookups", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--with-regex", action="store_true", help="Сравнить с перебором регулярок (медленно)")
+    args = parser.parse_args()
+
+    routes = make_routes(args.routes)
+    table = RouteTable()
+    started = time.perf_counter()
+    table.rebuild(routes)
+    print(f"Компиляция {len(routes)} маршрутов: {(time.perf_counter() - started) * 1000:.1f} мс")
+
+    rng = random.Random(42)
+    mounts = [r.mount() for r in routes.values()]
+    paths = [f"{rng.choice(mounts)}/items/{rng.randrange(10**6)}/details" for _ in range(args.lookups)]
+    paths += [f"unknown{i}/x" for i in range(args.lookups // 10)]
+
+    print(f"Поиск в дереве: {bench(table.match, paths, args.repeat):.0f} нс/запрос")
+    if args.with_regex:
+        sample = paths[:200]
+        print(f"Перебор регулярок: {bench(regex_matcher(routes), sample, 1):.0f} нс/запрос")
+
+
+if __name__ == "__main__":
+    main()
+
+
+bench_gateway.py
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import statistics
+import tempfile
+import time
+import httpx
+import uvicorn
+import yaml
 from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+CHUNK = b"x" * 65536
+
+
+def create_stub_app(latency: float) -> FastAPI:
+    """Апстрим-заглушка: маленький JSON, большое тело и SSE-поток"""
+    app = FastAPI()
+
+    @app.get("/small")
+    async def small():
+        await asyncio.sleep(latency)
+        return {"status": "ok", "items": list(range(10))}
+
+    @app.get("/large")
+    async def large(size: int = 10 * 1024 * 1024):
+        await asyncio.sleep(latency)
+
+        async def body():
+            sent = 0
+            while sent < size:
+                chunk = CHUNK[:size - sent]
+                sent += len(chunk)
+                yield chunk
+        return StreamingResponse(body(), media_type="application/octet-stream",
+                                 headers={"Content-Length": str(size)})
+
+    @app.get("/stream")
+    async def stream(events: int = 20, interval: float = 0.05):
+        async def body():
+            for i in range(events):
+                yield f"data: {{\"token\": {i}}}\n\n".encode()
+                await asyncio.sleep(interval)
+        return StreamingResponse(body(), media_type="text/event-stream")
+
+    return app
+
+
+def run_stub(port: int, latency: float):
+    uvicorn.run(create_stub_app(latency), host="127.0.0.1", port=port, log_level="error")
+
+
+def run_gateway(port: int, workdir: str):
+    # Шлюз читает config.yaml из текущего каталога при импорте routes_store
+    os.chdir(workdir)
+    from main import app
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="error")
+
+
+def process_stats(pid: int) -> dict:
+    """RSS и число открытых сокетов процесса (Linux /proc)"""
+    stats = {"rss_mb": None, "sockets": None}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    stats["rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+        fd_dir = f"/proc/{pid}/fd"
+        stats["sockets"] = sum(1 for fd in os.listdir(fd_dir) if os.readlink(f"{fd_dir}/{fd}").startswith("socket:"))
+    except OSError:
+        pass
+    return stats
+
+
+async def wait_ready(url: str, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} не поднялся за {timeout} с")
+
+
+async def run_scenario(name: str, url: str, concurrency: int, duration: float, gateway_pid: int) -> dict:
+    latencies, ttfbs, errors, received = [], [], 0, 0
+    peak = {"rss_mb": 0.0, "sockets": 0}
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def client_loop(client: httpx.AsyncClient):
+        nonlocal errors, received
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            try:
+                async with client.stream("GET", url) as resp:
+                    first = True
+                    async for chunk in resp.aiter_raw():
+                        if first:
+                            ttfbs.append(time.monotonic() - started)
+                            first = False
+                        received += len(chunk)
+                    if resp.status_code >= 400:
+                        errors += 1
+                        continue
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.monotonic() - started)
+
+    async def sample():
+        while time.monotonic() < deadline:
+            stats = process_stats(gateway_pid)
+            for key in peak:
+                if stats[key] is not None:
+                    peak[key] = max(peak[key], stats[key])
+            await asyncio.sleep(0.2)
+
+    started = time.monotonic()
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        await asyncio.gather(sample(), *(client_loop(client) for _ in range(concurrency)))
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    ttfbs.sort()
+
+    def q(values, p):
+        return round(values[min(len(values) - 1, int(p * len(values)))] * 1000, 2) if values else None
+
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "mb_per_s": round(received / elapsed / 1024 / 1024, 1),
+        "p50_ms": q(latencies, 0.50),
+        "p99_ms": q(latencies, 0.99),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else None,
+        "ttfb_p50_ms": q(ttfbs, 0.50),
+        "ttfb_p99_ms": q(ttfbs, 0.99),
+        "gateway_peak_rss_mb": peak["rss_mb"],
+        "gateway_peak_sockets": peak["sockets"],
+    }
+
+
+async def run_benchmark(args, gateway_pid: int) -> list:
+    base = f"http://127.0.0.1:{args.gateway_port}/api/stub"
+    urls = {
+        "small": f"{base}/small",
+        "large": f"{base}/large?size={args.large_size}",
+        "stream": f"{base}/stream?events={args.stream_events}&interval={args.stream_interval}",
+    }
+    await wait_ready(f"http://127.0.0.1:{args.stub_port}/small")
+    await wait_ready(f"{base}/small")
+    results = []
+    for name in args.scenarios.split(","):
+        results.append(await run_scenario(name, urls[name], args.concurrency, args.duration, gateway_pid))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест шлюза на локальных апстрим-заглушках")
+    parser.add_argument("--scenarios", default="small,large,stream", help="Через запятую: small, large, stream")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0, help="Длительность каждого сценария, с")
+    parser.add_argument("--latency-ms", type=float, default=10.0, help="Фиксированная задержка апстрима")
+    parser.add_argument("--large-size", type=int, default=10 * 1024 * 1024, help="Размер большого ответа, байт")
+    parser.add_argument("--stream-events", type=int, default=20)
+    parser.add_argument("--stream-interval", type=float, default=0.05)
+    parser.add_argument("--gateway-port", type=int, default=18080)
+    parser.add_argument("--stub-port", type=int, default=18081)
+    parser.add_argument("--output", "-o", help="Сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="gateway-bench-")
+    with open(os.path.join(workdir, "config.yaml"), "w") as f:
+        yaml.safe_dump({"routes": {"stub": {"url": f"http://127.0.0.1:{args.stub_port}"}}}, f)
+
+    # Заглушка и шлюз — отдельные процессы, чтобы клиент не делил с ними event loop
+    stub = mp.Process(target=run_stub, args=(args.stub_port, args.latency_ms / 1000), daemon=True)
+    gateway = mp.Process(target=run_gateway, args=(args.gateway_port, workdir), daemon=True)
+    stub.start()
+    gateway.start()
+    try:
+        results = asyncio.run(run_benchmark(args, gateway.pid))
+    finally:
+        gateway.terminate()
+        stub.terminate()
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
+
+
+main.py
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from router import router
 from admin_routes import admin_router
+from http_client import create_http_client
+from routes_store import store
+from upstreams import pools
+from resilience import guards
+from cache import response_cache
+from metrics import gateway_metrics
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.http_client = create_http_client()
+    routes_watcher = asyncio.create_task(store.watch())
+    health_checker = asyncio.create_task(pools.run_health_checks(app.state.http_client, store.all_routes))
+    try:
+        yield
+    finally:
+        routes_watcher.cancel()
+        health_checker.cancel()
+        await app.state.http_client.aclose()
 
-app = FastAPI(title="Dynamic API Gateway")
+
+app = FastAPI(title="Dynamic API Gateway", lifespan=lifespan)
+
+
+# async — в event loop: рендер дешёвый, а из threadpool он обходил бы словари,
+# которые в этот момент пополняет обработка запросов
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    return PlainTextResponse(
+        gateway_metrics.render(request.app.state.http_client, pools, guards, response_cache),
+        media_type="text/plain; version=0.0.4"
+    )
 
 app.include_router(router, prefix="/api")
 app.include_router(admin_router)
@@ -80,28 +1602,306 @@ app.include_router(admin_router)
 router.py
 
 from fastapi import APIRouter, Request, Response
+import asyncio
+import math
+import time
 import httpx
-from routes_store import store
+from fastapi.responses import StreamingResponse
+from routes_store import Route, DEFAULT_KEY_HEADER
+from upstreams import pools, UpstreamPool
+from cache import response_cache, response_ttl, CacheEntry, RouteCache, CACHE_KEY_HEADERS
+from resilience import guards
+from ratelimit import rate_limiter
+from route_table import route_table
+from metrics import gateway_metrics, RouteMetrics, TRACE_HEADER
 
 router = APIRouter()
+# Под этим именем в метриках учитываются запросы без подходящего маршрута
+UNMATCHED_ROUTE = "_unmatched"
 
-@router.api_route("/{service}/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
-async def proxy(service: str, path: str, request: Request):
-    target = store.get(service)
-    if not target:
-        return Response(content=f"Unknown service: {service}", status_code=404)
-    
-    target_url = f"{target}/{path}"
-    async with httpx.AsyncClient() as client:
+# Hop-by-hop заголовки (RFC 7230, 6.1) относятся к конкретному соединению и не проксируются
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "trailers", "transfer-encoding", "upgrade",
+}
+# Запросы с учётными данными не кешируем — ответ может быть персональным
+PRIVATE_REQUEST_HEADERS = ("authorization", "cookie")
+
+
+class ProxyError(Exception):
+    def __init__(self, status_code: int, message: str, headers: dict | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+        self.headers = headers
+
+
+def filter_headers(raw_headers, drop: set = frozenset()) -> list:
+    """Убирает из сырых (bytes) заголовков hop-by-hop, а также перечисленные в Connection"""
+    connection_tokens = {
+        token.strip().lower()
+        for key, value in raw_headers
+        if key.lower() == b"connection"
+        for token in value.decode("latin-1").split(",")
+    }
+    skip = HOP_BY_HOP_HEADERS | connection_tokens | drop
+    return [(key, value) for key, value in raw_headers if key.decode("latin-1").lower() not in skip]
+
+
+async def iter_upstream(resp, on_close=None, prefix=(), chunks=None):
+    """Отдаёт тело апстрима как есть и всегда закрывает ответ (в т.ч. при обрыве клиента)"""
+    try:
+        for chunk in prefix:
+            yield chunk
+        async for chunk in (chunks if chunks is not None else resp.aiter_raw()):
+            yield chunk
+    finally:
+        await resp.aclose()
+        if on_close is not None:
+            on_close()
+
+
+async def send_upstream(request: Request, route: Route, pool: UpstreamPool, path: str, headers: list, content=None):
+    """
+    Проверяет размыкатель и bulkhead маршрута, выбирает реплику и отправляет запрос;
+    возвращает потоковый ответ и колбэк, освобождающий реплику и слот bulkhead.
+    """
+    service = route.name
+    guard = guards.get(route)
+    breaker = guard.breaker
+    if breaker is not None and not breaker.allow():
+        raise ProxyError(503, f"Circuit open for service: {service}",
+                         headers={"Retry-After": str(max(1, round(breaker.retry_after())))})
+    limit = getattr(request.state, "rate_limit_class", None)
+    max_share = limit.max_share if limit is not None else 100.0
+    if not guard.try_acquire(max_share):
+        if breaker is not None:
+            breaker.cancel()
+        if max_share < 100.0:
+            # Маршрут занят приоритетным трафиком — просим низкоприоритетного клиента повторить позже
+            raise ProxyError(429, f"Service {service} is saturated, retry later", headers={"Retry-After": "1"})
+        raise ProxyError(503, f"Too many concurrent requests to service: {service}")
+    upstream = pool.pick()
+    if upstream is None:
+        guard.release()
+        if breaker is not None:
+            breaker.cancel()
+        raise ProxyError(503, f"No healthy upstream for service: {service}")
+
+    def release():
+        pool.release(upstream)
+        guard.release()
+
+    def observe(ok: bool, latency: float):
+        pool.observe(upstream, ok=ok, latency=latency)
+        if breaker is not None:
+            breaker.record(ok, latency)
+
+    trace_id = request.state.trace_id
+    headers = [(k, v) for k, v in headers if k.lower() != TRACE_HEADER.encode()]
+    headers.append((TRACE_HEADER.encode(), trace_id.encode("latin-1")))
+
+    target_url = f"{upstream.url}/{path}"
+    if request.url.query:
+        target_url = f"{target_url}?{request.url.query}"
+    client = request.app.state.http_client
+    t = route.timeouts
+    started = time.monotonic()
+    try:
+        # Сборка запроса тоже внутри try: битый URL апстрима (httpx.InvalidURL) не должен держать слот
         req = client.build_request(
-            method=request.method,
-            url=target_url,
-            headers=request.headers.raw,
-            content=await request.body()
+            method=request.method, url=target_url, headers=headers, content=content,
+            timeout=httpx.Timeout(connect=t.connect, read=t.read, write=t.write, pool=t.pool)
         )
         resp = await client.send(req, stream=True)
+    except httpx.TimeoutException:
+        observe(False, time.monotonic() - started)
+        release()
+        raise ProxyError(504, f"Upstream timeout: {service}")
+    except httpx.TransportError:
+        observe(False, time.monotonic() - started)
+        release()
+        raise ProxyError(502, f"Upstream unavailable: {service}")
+    except BaseException:
+        release()
+        if breaker is not None:
+            breaker.cancel()
+        raise
+    latency = time.monotonic() - started
+    observe(resp.status_code < 500, latency)
+    gateway_metrics.route(service).upstream_latency.observe(latency)
+    return resp, release
+
+
+def stream_response(resp, on_close, prefix=(), chunks=None) -> StreamingResponse:
+    # aiter_raw не распаковывает тело, поэтому Content-Encoding/Content-Length остаются валидными
+    response = StreamingResponse(
+        iter_upstream(resp, on_close=on_close, prefix=prefix, chunks=chunks),
+        status_code=resp.status_code
+    )
+    # Сырые заголовки, чтобы не потерять повторяющиеся (Set-Cookie и т.п.)
+    response.raw_headers = filter_headers(resp.headers.raw)
+    return response
+
+
+def cached_response(entry: CacheEntry, state: str) -> Response:
+    response = Response(content=entry.body, status_code=entry.status_code)
+    response.raw_headers = [
+        (k, v) for k, v in entry.headers if k.lower() != b"content-length"
+    ] + [
+        (b"content-length", str(len(entry.body)).encode()),
+        (b"age", str(int(time.time() - entry.stored_at)).encode()),
+        (b"x-cache", state.encode()),
+    ]
+    return response
+
+
+async def fetch_and_store(request: Request, route: Route, pool: UpstreamPool, path: str,
+                          route_cache: RouteCache, key: str, entry: CacheEntry | None):
+    """Промах или устаревшая запись: запрос в апстрим (условный, если есть валидаторы)"""
+    config = route_cache.config
+    headers = filter_headers(request.headers.raw, drop={"host", "if-none-match", "if-modified-since"})
+    if entry is not None:
+        headers += entry.conditional_headers()
+    resp, release = await send_upstream(request, route, pool, path, headers)
+
+    if resp.status_code == 304 and entry is not None:
+        await resp.aclose()
+        release()
+        route_cache.stats["revalidated"] += 1
+        ttl = response_ttl(resp.headers, config.default_ttl)
+        if ttl is not None:
+            entry.expires_at = time.time() + ttl
+            entry.stored_at = time.time()
+            entry.etag = resp.headers.get("etag", entry.etag)
+            await route_cache.put(key, entry)
+        return entry, cached_response(entry, "REVALIDATED")
+
+    route_cache.stats["misses"] += 1
+    ttl = response_ttl(resp.headers, config.default_ttl) if resp.status_code == 200 else None
+    etag, last_modified = resp.headers.get("etag"), resp.headers.get("last-modified")
+    length = resp.headers.get("content-length")
+    if ttl is None or (ttl <= 0 and not (etag or last_modified)) or (length and int(length) > config.max_body_bytes):
+        return None, stream_response(resp, release)
+
+    chunks, size = [], 0
+    body_iter = resp.aiter_raw()
+    try:
+        async for chunk in body_iter:
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > config.max_body_bytes:
+                # Тело оказалось больше лимита — досылаем остаток потоком без кеширования
+                return None, stream_response(resp, release, prefix=chunks, chunks=body_iter)
+    except BaseException:
+        await resp.aclose()
+        release()
+        raise
+    await resp.aclose()
+    release()
+
+    entry = CacheEntry(
+        status_code=resp.status_code,
+        headers=filter_headers(resp.headers.raw),
+        body=b"".join(chunks),
+        expires_at=time.time() + ttl,
+        etag=etag,
+        last_modified=last_modified,
+    )
+    await route_cache.put(key, entry)
+    return entry, cached_response(entry, "MISS")
+
+
+async def cached_proxy(request: Request, route: Route, pool: UpstreamPool, path: str):
+    route_cache = response_cache.get(route.name, route.cache)
+    # Ключ клиента тоже в ключе кеша: апстрим может отвечать каждому клиенту по-своему
+    key_header = route.rate_limit.key_header if route.rate_limit is not None else DEFAULT_KEY_HEADER
+    key = "\x00".join([
+        path,
+        request.url.query,
+        *(request.headers.get(h, "") for h in CACHE_KEY_HEADERS),
+        request.headers.get(key_header, ""),
+    ])
+    entry = await route_cache.get(key)
+    revalidate = "no-cache" in request.headers.get("cache-control", "").lower()
+    if entry is not None and entry.fresh() and not revalidate:
+        route_cache.stats["hits"] += 1
+        return cached_response(entry, "HIT")
+
+    # Одновременные одинаковые промахи ждут один запрос в апстрим
+    leader = route_cache.inflight.get(key)
+    if leader is not None:
+        shared = await asyncio.shield(leader)
+        if shared is not None:
+            route_cache.stats["collapsed"] += 1
+            return cached_response(shared, "HIT")
+        # Ответ лидера оказался некешируемым — идём в апстрим сами
+        headers = filter_headers(request.headers.raw, drop={"host"})
+        return stream_response(*await send_upstream(request, route, pool, path, headers))
+
+    future = asyncio.get_running_loop().create_future()
+    route_cache.inflight[key] = future
+    stored = None
+    try:
+        stored, response = await fetch_and_store(request, route, pool, path, route_cache, key, entry)
+        return response
+    finally:
+        route_cache.inflight.pop(key, None)
+        future.set_result(stored)
+
+
+async def route_request(request: Request, route: Route, remainder: str, route_metrics: RouteMetrics) -> Response:
+    service = route.name
+    path = route.upstream_path(remainder)
+    pool = pools.get(route)
+
+    wait, limit = rate_limiter.admit(route, request)
+    if wait > 0:
         return Response(
-            content=await resp.aread(),
-            status_code=resp.status_code,
-            headers=resp.headers
+            content=f"Rate limit exceeded for service: {service}",
+            status_code=429,
+            headers={"Retry-After": str(math.ceil(wait))}
         )
+    request.state.rate_limit_class = limit
+
+    try:
+        if route.cache is not None and request.method == "GET":
+            if any(h in request.headers for h in PRIVATE_REQUEST_HEADERS) \
+                    or "no-store" in request.headers.get("cache-control", "").lower():
+                response_cache.get(route.name, route.cache).stats["bypass"] += 1
+            else:
+                return await cached_proxy(request, route, pool, path)
+
+        # Тело запроса уходит в апстрим потоком, без буферизации в памяти;
+        # Host выставляет httpx по адресу апстрима
+        has_body = "content-length" in request.headers or "transfer-encoding" in request.headers
+        resp, release = await send_upstream(
+            request, route, pool, path,
+            headers=filter_headers(request.headers.raw, drop={"host"}),
+            content=gateway_metrics.count_stream(request.stream(), route_metrics, "bytes_in") if has_body else None
+        )
+    except ProxyError as e:
+        return Response(content=e.message, status_code=e.status_code, headers=e.headers)
+    return stream_response(resp, release)
+
+
+@router.api_route("/{full_path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
+async def proxy(full_path: str, request: Request):
+    started = time.monotonic()
+    request.state.trace_id = gateway_metrics.trace_id(request.headers)
+    match = route_table.match(full_path)
+    if match is None:
+        route_metrics = gateway_metrics.route(UNMATCHED_ROUTE)
+        response = Response(content=f"Unknown service: {full_path.split('/', 1)[0]}", status_code=404)
+    else:
+        route_metrics = gateway_metrics.route(match[0].name)
+        response = await route_request(request, match[0], match[1], route_metrics)
+
+    route_metrics.statuses[response.status_code] += 1
+    route_metrics.latency.observe(time.monotonic() - started)
+    if isinstance(response, StreamingResponse):
+        response.body_iterator = gateway_metrics.count_stream(response.body_iterator, route_metrics, "bytes_out")
+    else:
+        route_metrics.bytes_out += len(response.body)
+    response.raw_headers.append((TRACE_HEADER.encode(), request.state.trace_id.encode("latin-1")))
+    return response
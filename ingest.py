@@ -0,0 +1,199 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, List
+
+from fastapi import FastAPI, File, UploadFile
+from fastapi.responses import StreamingResponse
+
+CACHE_DIR = Path(os.getenv("INGEST_CACHE_DIR", "./ingest_cache"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+# Меняется вместе с логикой разбора, чтобы не отдавать результаты старого парсера
+PARSER_VERSION = "5"
+CHUNK_SIZE = 1024 * 1024
+
+
+class ResultCache:
+    """Результаты разбора на диске по SHA-256 содержимого: <dir>/<2 символа>/<хеш>.json"""
+
+    def __init__(self, cache_dir: Path = CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _path(self, digest: str) -> Path:
+        return self.cache_dir / digest[:2] / f"{digest}.json"
+
+    def get(self, digest: str) -> dict | None:
+        try:
+            with open(self._path(digest), encoding="utf-8") as f:
+                result = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return result if result.get("parser_version") == PARSER_VERSION else None
+
+    def put(self, digest: str, result: dict):
+        path = self._path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({**result, "parser_version": PARSER_VERSION}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def parse_file_job(path: str) -> dict:
+    """Выполняется в процессе пула"""
+    from pa import parse_document
+    return {"markdown": parse_document(path)}
+
+
+def copy_hashing(src, dst_path: str) -> str:
+    """Копирует поток в файл и одновременно считает SHA-256"""
+    digest = hashlib.sha256()
+    with open(dst_path, "wb") as dst:
+        while chunk := src.read(CHUNK_SIZE):
+            digest.update(chunk)
+            dst.write(chunk)
+    return digest.hexdigest()
+
+
+def spool_inputs(sources, workdir: str) -> list:
+    """
+    sources — пары (имя, бинарный поток). Zip-архивы (по расширению .zip) раскрываются в свои файлы.
+    Возвращает [(имя, путь, sha256)] в исходном порядке.
+    """
+    items = []
+    for name, stream in sources:
+        if name.lower().endswith(".zip"):
+            with zipfile.ZipFile(stream) as archive:
+                for member in archive.infolist():
+                    if member.is_dir():
+                        continue
+                    with archive.open(member) as src:
+                        items.append(_spool_one(f"{name}/{member.filename}", src, workdir, len(items)))
+        else:
+            items.append(_spool_one(name, stream, workdir, len(items)))
+    return items
+
+
+def _spool_one(name: str, stream, workdir: str, index: int) -> tuple:
+    # Расширение сохраняем — запасной признак формата, если сигнатура не опознана
+    path = os.path.join(workdir, f"{index}{Path(name).suffix.lower()}")
+    return name, path, copy_hashing(stream, path)
+
+
+async def ingest(items: list, executor, cache: ResultCache) -> AsyncIterator[dict]:
+    """
+    Дедупликация по хешу (в пределах пакета и с кешем), параллельный разбор промахов,
+    результаты — строго в порядке входа, по мере готовности очередного.
+    """
+    loop = asyncio.get_running_loop()
+    jobs = {}
+    for _, path, digest in items:
+        if digest in jobs:
+            continue
+        cached = await asyncio.to_thread(cache.get, digest)
+        if cached is not None:
+            future = loop.create_future()
+            future.set_result(cached)
+            jobs[digest] = (True, future)
+        else:
+            jobs[digest] = (False, loop.run_in_executor(executor, parse_file_job, path))
+
+    seen = set()
+    for index, (name, _, digest) in enumerate(items):
+        from_cache, future = jobs[digest]
+        record = {"index": index, "filename": name, "sha256": digest, "cached": from_cache or digest in seen}
+        try:
+            result = await future
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+        else:
+            if not from_cache and digest not in seen:
+                await asyncio.to_thread(cache.put, digest, result)
+            record.update({k: v for k, v in result.items() if k != "parser_version"})
+        seen.add(digest)
+        yield record
+
+
+executor: ProcessPoolExecutor | None = None
+result_cache = ResultCache()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global executor
+    executor = ProcessPoolExecutor(max_workers=INGEST_WORKERS)
+    try:
+        yield
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.post("/process_batch")
+async def process_batch(files: List[UploadFile] = File(...)):
+    """Много файлов и/или zip-архивов; ответ — NDJSON, по строке на документ в порядке входа"""
+    workdir = tempfile.mkdtemp(prefix="ingest-")
+    try:
+        items = await asyncio.to_thread(spool_inputs, [(f.filename, f.file) for f in files], workdir)
+    except BaseException:
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise
+
+    async def lines():
+        try:
+            async for record in ingest(items, executor, result_cache):
+                yield json.dumps(record, ensure_ascii=False) + "\n"
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+async def run_cli(paths: list, workers: int, output):
+    workdir = tempfile.mkdtemp(prefix="ingest-")
+    try:
+        handles = [open(p, "rb") for p in paths]
+        try:
+            items = spool_inputs([(p, h) for p, h in zip(paths, handles)], workdir)
+        finally:
+            for h in handles:
+                h.close()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            async for record in ingest(items, pool, result_cache):
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    global result_cache
+    parser = argparse.ArgumentParser(description="Пакетный разбор документов с кешем по хешу содержимого")
+    parser.add_argument("paths", nargs="+", help="Файлы docx/pdf и zip-архивы с ними")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    parser.add_argument("--cache-dir", default=str(CACHE_DIR))
+    parser.add_argument("--output", "-o", help="Файл NDJSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    result_cache = ResultCache(Path(args.cache_dir))
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        asyncio.run(run_cli(args.paths, args.workers, output))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
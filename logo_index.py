@@ -0,0 +1,285 @@
+import argparse
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+DEFAULT_SCALES = (0.5, 0.75, 1.0, 1.25, 1.5, 2.0)
+MIN_TEMPLATE_SIDE = 8     # меньше — корреляция почти на любом шуме
+MIN_TEMPLATE_STD = 1.0    # плоский шаблон: TM_CCOEFF_NORMED для него не определён
+COARSE_FACTOR = 4         # во сколько раз уменьшаются страница и шаблоны на грубом проходе
+COARSE_MARGIN = 0.25      # насколько ниже порога допускаем кандидатов на грубом проходе
+COARSE_CANDIDATES = 3     # сколько кандидатов на шаблон уточняем в полном разрешении
+NMS_IOU = 0.3             # рамки с большим перекрытием считаются одним и тем же логотипом
+
+
+def to_gray(image: np.ndarray) -> np.ndarray:
+    """BGR/BGRA/серое -> серое uint8; прозрачность BGRA накладывается на белый, как фон страницы"""
+    if image.ndim == 2:
+        return image
+    if image.shape[2] == 4:
+        alpha = image[..., 3:].astype(np.float32) / 255
+        bgr = image[..., :3].astype(np.float32) * alpha + 255 * (1 - alpha)
+        image = bgr.astype(np.uint8)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def find_peaks(res: np.ndarray, threshold: float, min_distance: int = 1, top_k: int | None = None) -> tuple:
+    """
+    Локальные максимумы карты корреляции >= threshold вместо всех пикселей над порогом.
+    Карта режется на клетки min_distance x min_distance; пик — максимум клетки, не меньший
+    максимумов восьми соседних клеток. Стоимость — один проход по карте при любом пороге.
+    Возвращает (xs, ys, scores) по убыванию score, не больше top_k.
+    """
+    empty = (np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0, dtype=res.dtype))
+    if res.size == 0 or not (res >= threshold).any():
+        return empty
+
+    r = max(1, int(min_distance))
+    h, w = res.shape
+    hb, wb = -(-h // r), -(-w // r)
+    padded = np.full((hb * r, wb * r), -np.inf, dtype=res.dtype)
+    padded[:h, :w] = res
+    cell_max = padded.reshape(hb, r, wb, r).max(axis=(1, 3))
+    neighbours = cv2.dilate(cell_max, cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3)))
+    by, bx = np.nonzero((cell_max >= threshold) & (cell_max >= neighbours))
+    scores = cell_max[by, bx]
+
+    if top_k is not None and len(scores) > top_k:
+        part = np.argpartition(-scores, top_k - 1)[:top_k]
+        by, bx, scores = by[part], bx[part], scores[part]
+    order = np.argsort(-scores, kind="stable")
+    by, bx, scores = by[order], bx[order], scores[order]
+
+    # Положение максимума внутри каждой выбранной клетки
+    offsets = np.arange(r)
+    cells = padded[(by[:, None] * r + offsets)[:, :, None], (bx[:, None] * r + offsets)[:, None, :]]
+    arg = cells.reshape(len(scores), -1).argmax(axis=1)
+    return bx * r + arg % r, by * r + arg // r, scores
+
+
+def nms(boxes, scores, iou_threshold: float = NMS_IOU) -> np.ndarray:
+    """
+    Жадное подавление немаксимумов: индексы оставленных рамок (x1, y1, x2, y2) по убыванию score.
+    IoU с остальными считается векторно; пустой вход — пустой результат.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float32)
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.intp)
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size:
+        i, rest = order[0], order[1:]
+        keep.append(i)
+        inter_w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = inter_w * inter_h
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-6)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.intp)
+
+
+def cap_per_group(groups: np.ndarray, scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Индексы не более top_k лучших по score элементов в каждой группе"""
+    if len(groups) == 0:
+        return np.empty(0, dtype=np.intp)
+    order = np.lexsort((-scores, groups))
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    return order[rank < top_k]
+
+
+class LogoIndex:
+    """
+    Эталонные логотипы, подготовленные один раз: серые шаблоны во всех масштабах и их уменьшенные копии.
+    Строится из набора логотипов, сохраняется на диск и переиспользуется на тысячах страниц через detect().
+    """
+
+    def __init__(self, scales=DEFAULT_SCALES, coarse_factor: int = COARSE_FACTOR):
+        self.scales = tuple(float(s) for s in scales)
+        self.coarse_factor = coarse_factor
+        self.names = []
+        self.templates = []  # {"logo": индекс в names, "scale", "image", "coarse"}
+
+    def add(self, name: str, logo: np.ndarray):
+        """Добавляет логотип (BGR/BGRA/серое) во всех масштабах индекса"""
+        gray = to_gray(logo)
+        logo_idx = len(self.names)
+        self.names.append(name)
+        for scale in self.scales:
+            width, height = int(gray.shape[1] * scale), int(gray.shape[0] * scale)
+            if min(width, height) < MIN_TEMPLATE_SIDE:
+                continue
+            image = cv2.resize(gray, (width, height), interpolation=cv2.INTER_AREA)
+            self._add_template(logo_idx, scale, image)
+
+    def _add_template(self, logo_idx: int, scale: float, image: np.ndarray):
+        # Разброс яркости нужен только здесь — отсеять плоские шаблоны; в индексе не хранится
+        if cv2.meanStdDev(image)[1][0, 0] < MIN_TEMPLATE_STD:
+            return
+        self.templates.append({
+            "logo": logo_idx,
+            "scale": scale,
+            "image": np.ascontiguousarray(image),
+            "coarse": self._coarse(image),
+        })
+
+    def _coarse(self, image: np.ndarray) -> np.ndarray | None:
+        """Уменьшенный шаблон для грубого прохода; None — мал или плосок, ищем только в полном разрешении"""
+        f = self.coarse_factor
+        width, height = image.shape[1] // f, image.shape[0] // f
+        if f <= 1 or min(width, height) < MIN_TEMPLATE_SIDE:
+            return None
+        coarse = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+        return coarse if cv2.meanStdDev(coarse)[1][0, 0] >= MIN_TEMPLATE_STD else None
+
+    @classmethod
+    def from_files(cls, paths, scales=DEFAULT_SCALES, coarse_factor: int = COARSE_FACTOR) -> "LogoIndex":
+        index = cls(scales, coarse_factor)
+        for path in paths:
+            logo = cv2.imread(str(path), cv2.IMREAD_UNCHANGED)
+            if logo is None:
+                raise ValueError(f"Не удалось прочитать логотип: {path}")
+            index.add(Path(path).stem, logo)
+        return index
+
+    def save(self, path: str):
+        """Один .npz: шаблоны массивами, остальное — JSON-метаданными"""
+        meta = {
+            "scales": self.scales,
+            "coarse_factor": self.coarse_factor,
+            "names": self.names,
+            "templates": [{k: v for k, v in t.items() if k not in ("image", "coarse")} for t in self.templates],
+        }
+        arrays = {f"t{i}": t["image"] for i, t in enumerate(self.templates)}
+        arrays.update({f"c{i}": t["coarse"] for i, t in enumerate(self.templates) if t["coarse"] is not None})
+        np.savez_compressed(path, meta=np.array(json.dumps(meta, ensure_ascii=False)), **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "LogoIndex":
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            index = cls(meta["scales"], meta["coarse_factor"])
+            index.names = meta["names"]
+            index.templates = [
+                {"logo": t["logo"], "scale": t["scale"],
+                 "image": data[f"t{i}"], "coarse": data[f"c{i}"] if f"c{i}" in data else None}
+                for i, t in enumerate(meta["templates"])
+            ]
+        return index
+
+    def _refine(self, gray_page: np.ndarray, tpl: np.ndarray, x: int, y: int) -> tuple:
+        """Точный поиск в окрестности кандидата ± 2 * coarse_factor пикселей"""
+        r = 2 * self.coarse_factor
+        h, w = tpl.shape
+        x0, y0 = max(0, x - r), max(0, y - r)
+        roi = gray_page[y0:min(gray_page.shape[0], y + r + h), x0:min(gray_page.shape[1], x + r + w)]
+        if roi.shape[0] < h or roi.shape[1] < w:
+            return -1.0, x, y
+        _, max_val, _, (dx, dy) = cv2.minMaxLoc(cv2.matchTemplate(roi, tpl, cv2.TM_CCOEFF_NORMED))
+        return max_val, x0 + dx, y0 + dy
+
+    def _match(self, gray_page: np.ndarray, coarse_page, template: dict, threshold: float, top_k: int) -> list:
+        """[(confidence, x, y)] совпадений шаблона >= threshold: грубо-точно, если есть грубый шаблон"""
+        tpl = template["image"]
+        coarse_tpl = template["coarse"]
+        if coarse_page is None or coarse_tpl is None or \
+                coarse_tpl.shape[0] > coarse_page.shape[0] or coarse_tpl.shape[1] > coarse_page.shape[1]:
+            res = cv2.matchTemplate(gray_page, tpl, cv2.TM_CCOEFF_NORMED)
+            xs, ys, scores = find_peaks(res, threshold, min(tpl.shape) // 2, top_k)
+            return list(zip(scores.tolist(), xs.tolist(), ys.tolist()))
+
+        f = self.coarse_factor
+        res = cv2.matchTemplate(coarse_page, coarse_tpl, cv2.TM_CCOEFF_NORMED)
+        xs, ys, _ = find_peaks(res, threshold - COARSE_MARGIN, min(coarse_tpl.shape) // 2,
+                               max(COARSE_CANDIDATES, top_k))
+        refined = (self._refine(gray_page, tpl, x * f, y * f) for x, y in zip(xs.tolist(), ys.tolist()))
+        return [hit for hit in refined if hit[0] >= threshold]
+
+    def detect(self, page_image: np.ndarray, threshold: float = 0.8, coarse: bool = True,
+               top_k: int = 1, iou_threshold: float = NMS_IOU) -> list:
+        """
+        До top_k совпадений каждого логотипа с confidence >= threshold (по умолчанию — лучшее).
+        coarse=True — кандидаты ищутся на уменьшенных в coarse_factor раз странице и шаблонах
+        и уточняются в полном разрешении только в их окрестности; coarse=False — полный перебор.
+        Пересекающиеся рамки всех логотипов и масштабов схлопываются через nms().
+        Возвращает [{"logo", "position", "size", "scale", "confidence"}] по убыванию confidence.
+        """
+        gray_page = to_gray(page_image)
+        page_h, page_w = gray_page.shape
+        coarse_page = None
+        if coarse and self.coarse_factor > 1:
+            f = self.coarse_factor
+            coarse_page = cv2.resize(gray_page, (page_w // f, page_h // f), interpolation=cv2.INTER_AREA)
+
+        boxes, scores, template_ids = [], [], []
+        for template_id, template in enumerate(self.templates):
+            h, w = template["image"].shape
+            if h > page_h or w > page_w:
+                continue
+            for score, x, y in self._match(gray_page, coarse_page, template, threshold, top_k):
+                boxes.append((x, y, x + w, y + h))
+                scores.append(score)
+                template_ids.append(template_id)
+
+        scores = np.asarray(scores, dtype=np.float32)
+        template_ids = np.asarray(template_ids, dtype=np.intp)
+        keep = nms(boxes, scores, iou_threshold)
+        logo_ids = np.asarray([t["logo"] for t in self.templates], dtype=np.intp)[template_ids[keep]]
+        keep = keep[cap_per_group(logo_ids, scores[keep], top_k)]
+
+        matches = []
+        for i in keep[np.argsort(-scores[keep], kind="stable")].tolist():
+            template = self.templates[template_ids[i]]
+            x1, y1, x2, y2 = boxes[i]
+            matches.append({
+                "logo": self.names[template["logo"]],
+                "position": (int(x1), int(y1)),
+                "size": (x2 - x1, y2 - y1),
+                "scale": template["scale"],
+                "confidence": float(scores[i]),
+            })
+        return matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Индекс эталонных логотипов: сборка и поиск по PDF")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Собрать индекс из картинок логотипов")
+    build.add_argument("logos", nargs="+")
+    build.add_argument("--scales", type=float, nargs="+", default=list(DEFAULT_SCALES))
+    build.add_argument("--coarse-factor", type=int, default=COARSE_FACTOR)
+    build.add_argument("--output", "-o", default="logo_index.npz")
+
+    detect = sub.add_parser("detect", help="Найти логотипы на первых страницах PDF")
+    detect.add_argument("pdfs", nargs="+")
+    detect.add_argument("--index", default="logo_index.npz")
+    detect.add_argument("--dpi", type=float, default=72)
+    detect.add_argument("--threshold", type=float, default=0.8)
+    detect.add_argument("--exhaustive", action="store_true", help="Без грубого прохода, полный перебор")
+    detect.add_argument("--top-k", type=int, default=1, help="Сколько вхождений каждого логотипа искать")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        index = LogoIndex.from_files(args.logos, args.scales, args.coarse_factor)
+        index.save(args.output)
+        print(f"Логотипов: {len(index.names)}, шаблонов: {len(index.templates)} -> {args.output}")
+        return
+
+    from raster import rasterizer
+    index = LogoIndex.load(args.index)
+    for pdf_path in args.pdfs:
+        page = rasterizer.render_dpi(pdf_path, 0, dpi=args.dpi)
+        matches = index.detect(cv2.cvtColor(page, cv2.COLOR_RGB2GRAY), threshold=args.threshold,
+                               coarse=not args.exhaustive, top_k=args.top_k)
+        print(json.dumps({"file": pdf_path, "matches": matches}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from dataclasses import dataclass
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+@dataclass
+class MockConfig:
+    """Параметры поведения фейкового OpenAI-совместимого сервера"""
+    latency_ms: float = 200.0          # базовая задержка до первого токена
+    latency_jitter: float = 0.3        # sigma логнормального разброса (0 — фиксированная задержка)
+    tokens_per_s: float = 50.0         # скорость "генерации" completion-токенов
+    completion_tokens: int = 64        # сколько токенов отвечаем (не больше max_tokens из запроса)
+    error_rate: float = 0.0            # доля запросов, отвечающих 500
+    max_concurrency: int = 8           # сколько запросов обслуживаем одновременно, остальные ждут
+    seed: int | None = None
+
+
+def create_app(config: MockConfig) -> FastAPI:
+    app = FastAPI(title="Mock OpenAI")
+    rng = random.Random(config.seed)
+    slots = asyncio.Semaphore(config.max_concurrency)
+    stats = {"requests": 0, "errors": 0, "in_flight": 0}
+
+    def sample_latency() -> float:
+        base = config.latency_ms / 1000
+        if config.latency_jitter <= 0:
+            return base
+        return base * rng.lognormvariate(0, config.latency_jitter)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        async with slots:
+            stats["in_flight"] += 1
+            try:
+                n_tokens = min(config.completion_tokens, body.get("max_tokens") or config.completion_tokens)
+                await asyncio.sleep(sample_latency() + n_tokens / config.tokens_per_s)
+                if rng.random() < config.error_rate:
+                    stats["errors"] += 1
+                    return JSONResponse({"error": {"message": "mock error", "type": "server_error"}}, status_code=500)
+            finally:
+                stats["in_flight"] -= 1
+
+        prompt = " ".join(m.get("content", "") for m in body.get("messages", []))
+        prompt_tokens = max(1, len(prompt.split()))
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(["tok"] * n_tokens)},
+                "finish_reason": "length" if n_tokens == body.get("max_tokens") else "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": n_tokens,
+                "total_tokens": prompt_tokens + n_tokens,
+            },
+        }
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "mock", "object": "model"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def add_mock_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Базовая задержка ответа, мс")
+    parser.add_argument("--latency-jitter", type=float, default=0.3, help="Sigma логнормального разброса задержки")
+    parser.add_argument("--tokens-per-s", type=float, default=50.0, help="Скорость генерации токенов")
+    parser.add_argument("--completion-tokens", type=int, default=64, help="Длина ответа в токенах")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов с ошибкой 500")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="Одновременно обслуживаемых запросов")
+
+
+def config_from_args(args, seed: int | None = None) -> MockConfig:
+    return MockConfig(
+        latency_ms=args.latency_ms,
+        latency_jitter=args.latency_jitter,
+        tokens_per_s=args.tokens_per_s,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        max_concurrency=args.max_concurrency,
+        seed=seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный фейковый OpenAI-совместимый сервер")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    add_mock_args(parser)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
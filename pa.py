@@ -1,84 +1,365 @@
-def parse_document(filepath: str) -> str:
+import hashlib
+import math
+import os
+import re
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# Бэкенды (python-docx, PyMuPDF) импортируются внутри парсеров: короткоживущий воркер
+# платит за импорт только тех библиотек, форматы которых ему реально попались.
+
+SNIFF_BYTES = 8192
+OLE_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+# Встроенные стили заголовков Word: "Heading 1" .. "Heading 9"
+HEADING_STYLE_RE = re.compile(r"^Heading (\d)$")
+
+# Сигнатуры в начале файла -> формат; контейнеры (zip, OLE) уточняются отдельно
+MAGIC_FORMATS = [
+    (b"%PDF-", "pdf"),
+    (b"{\\rtf", "rtf"),
+    (b"\x89PNG\r\n\x1a\n", "image"),
+    (b"\xff\xd8\xff", "image"),
+    (b"GIF87a", "image"),
+    (b"GIF89a", "image"),
+    (b"II*\x00", "image"),
+    (b"MM\x00*", "image"),
+    (b"BM", "image"),
+]
+
+EXTENSION_FORMATS = {
+    "pdf": "pdf", "docx": "docx", "doc": "doc", "rtf": "rtf", "msg": "msg",
+    "png": "image", "jpg": "image", "jpeg": "image", "gif": "image",
+    "tif": "image", "tiff": "image", "bmp": "image",
+}
+
+# формат -> функция (filepath, image_dir) -> markdown
+BACKENDS = {}
+
+
+def register_backend(fmt: str):
+    """Декоратор: регистрирует парсер формата. Новые форматы (doc, rtf, msg) добавляются так же."""
+    def decorator(func):
+        BACKENDS[fmt] = func
+        return func
+    return decorator
+
+
+def _sniff_zip(filepath: str) -> str | None:
+    try:
+        with zipfile.ZipFile(filepath) as archive:
+            names = set(archive.namelist())
+    except zipfile.BadZipFile:
+        return None
+    if "word/document.xml" in names:
+        return "docx"
+    return "zip"
+
+
+def _sniff_ole(filepath: str) -> str:
+    """doc и msg — оба OLE2; различаем по именам потоков (UTF-16LE в каталоге)"""
+    with open(filepath, "rb") as f:
+        data = f.read()
+    if "__substg1.0_".encode("utf-16-le") in data:
+        return "msg"
+    if "WordDocument".encode("utf-16-le") in data:
+        return "doc"
+    return "ole"
+
+
+def sniff_format(filepath: str) -> str | None:
+    """Формат по содержимому; расширение — только запасной вариант"""
+    with open(filepath, "rb") as f:
+        head = f.read(SNIFF_BYTES)
+    if head.startswith(b"PK\x03\x04"):
+        return _sniff_zip(filepath)
+    if head.startswith(OLE_MAGIC):
+        return _sniff_ole(filepath)
+    # %PDF- допускается не в самом начале (мусор перед заголовком)
+    if b"%PDF-" in head[:1024]:
+        return "pdf"
+    for magic, fmt in MAGIC_FORMATS:
+        if head.startswith(magic):
+            return fmt
+    return EXTENSION_FORMATS.get(Path(filepath).suffix.lower().lstrip("."))
+
+
+def parse_document(filepath: str, image_dir: str = "./images") -> str:
     """
     Возвращает markdown-строку.
     """
-    ext = filepath.lower().split('.')[-1]
-    if ext == 'docx':
-        return parse_docx(filepath)
-    elif ext == 'pdf':
-        return parse_pdf(filepath)
-    else:
-        raise ValueError("Unsupported file type")
+    fmt = sniff_format(filepath)
+    backend = BACKENDS.get(fmt)
+    if backend is None:
+        raise ValueError(f"Unsupported file type: {fmt or 'unknown'}")
+    return backend(filepath, image_dir)
 
-from docx import Document
-from docx.table import Table
-from docx.oxml.shared import qn
-import os
-from pathlib import Path
 
-def parse_docx(filepath: str, image_dir: str = "./images") -> str:
-    doc = Document(filepath)
-    md_lines = []
-    os.makedirs(image_dir, exist_ok=True)
+def _docx_image(doc, r_id: str, store, rid_paths: dict) -> str | None:
+    """Картинка по rId из a:blip; одна и та же часть пакета сохраняется один раз"""
+    if r_id not in rid_paths:
+        part = doc.part.related_parts.get(r_id)
+        if part is None or not hasattr(part, "blob"):
+            rid_paths[r_id] = None
+        else:
+            ext = Path(part.partname).suffix.lstrip(".").lower() or "bin"
+            rid_paths[r_id] = store.put(part.blob, ext)
+    return rid_paths[r_id]
+
 
-    for i, para in enumerate(doc.paragraphs):
-        text = para.text.strip()
-        if not text:
-            continue
+def _docx_paragraph(doc, para, store, rid_paths: dict) -> list:
+    from docx.oxml.shared import qn
 
-        # Заголовки
-        if para.style.name.startswith('Heading'):
-            level = int(para.style.name.split()[-1])
-            md_lines.append(f"{'#' * level} {text}")
+    md_lines = []
+    text = para.text.strip()
+    if text:
+        # Заголовки; пользовательские стили вроде "Heading Accent" — обычный параграф
+        heading = HEADING_STYLE_RE.match(para.style.name or "") if para.style is not None else None
+        if heading:
+            md_lines.append(f"{'#' * int(heading.group(1))} {text}")
         else:
             md_lines.append(text)
 
-        # Если в параграфе есть изображения — извлекаем их
-        for run in para.runs:
-            for embedded_obj in run.element.xpath('.//a:blip'):
-                # Извлечение изображения (нужно использовать python-docx2txt или docx2python)
-                # Пока пропускаем, см. ниже
+    # Изображения параграфа — сразу после его текста
+    for blip in para._p.iter(qn('a:blip')):
+        r_id = blip.get(qn('r:embed'))
+        image_path = _docx_image(doc, r_id, store, rid_paths) if r_id else None
+        if image_path:
+            md_lines.append(f"![Image]({image_path})")
+    return md_lines
+
+
+def _docx_cell(doc, cell, store, rid_paths: dict) -> str:
+    """Текст и картинки ячейки (включая вложенные таблицы) одной строкой markdown-таблицы"""
+    from docx.oxml.shared import qn
+    from docx.text.paragraph import Paragraph
+
+    parts = []
+    for p in cell._tc.iter(qn('w:p')):
+        parts.extend(_docx_paragraph(doc, Paragraph(p, cell), store, rid_paths))
+    return " ".join(parts).replace("|", "\\|")
+
 
-    # Извлечение таблиц
-    for table in doc.tables:
-        md_lines.append("\n| " + " | ".join([cell.text for cell in table.rows[0].cells]) + " |")
-        md_lines.append("| " + " | ".join(["---"] * len(table.rows[0].cells)) + " |")
-        for row in table.rows[1:]:
-            md_lines.append("| " + " | ".join([cell.text for cell in row.cells]) + " |")
+def _docx_table(doc, table, store, rid_paths: dict) -> str:
+    def row_line(row):
+        return "| " + " | ".join([_docx_cell(doc, cell, store, rid_paths) for cell in row.cells]) + " |"
+
+    rows = [row_line(table.rows[0]),
+            "| " + " | ".join(["---"] * len(table.rows[0].cells)) + " |"]
+    for row in table.rows[1:]:
+        rows.append(row_line(row))
+    return "\n".join(rows)
+
+
+@register_backend("docx")
+def parse_docx(filepath: str, image_dir: str = "./images") -> str:
+    """Один проход по телу документа: заголовки, абзацы, таблицы и картинки в исходном порядке"""
+    from docx import Document
+    from docx.oxml.shared import qn
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+
+    doc = Document(filepath)
+    store, rid_paths = ImageStore(image_dir), {}
+    md_lines = []
+
+    for child in doc.element.body.iterchildren():
+        if child.tag == qn('w:p'):
+            md_lines.extend(_docx_paragraph(doc, Paragraph(child, doc), store, rid_paths))
+        elif child.tag == qn('w:tbl'):
+            table = Table(child, doc)
+            if table.rows:
+                md_lines.append(_docx_table(doc, table, store, rid_paths))
 
     return "\n\n".join(md_lines)
 
-import fitz  # PyMuPDF
-import pandas as pd
 
-def parse_pdf(filepath: str, image_dir: str = "./images") -> str:
-    doc = fitz.open(filepath)
+class ImageStore:
+    """
+    Контентно-адресуемое хранилище картинок: <root>/<ab>/<cd>/<sha256>.<ext>.
+    Один и тот же логотип из разных страниц и документов пишется на диск один раз;
+    запись атомарная (временный файл + os.replace), поэтому параллельные разборы не мешают друг другу.
+    """
+
+    def __init__(self, root: str = "./images"):
+        self.root = root
+
+    def path_for(self, digest: str, ext: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}.{ext}")
+
+    def put(self, data: bytes, ext: str) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest, ext)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return path
+
+
+def _store_xref(doc, xref: int, store: ImageStore, xref_paths: dict) -> str:
+    """В пределах документа картинка с одним xref извлекается один раз"""
+    path = xref_paths.get(xref)
+    if path is None:
+        base_image = doc.extract_image(xref)
+        path = store.put(base_image["image"], base_image["ext"])
+        xref_paths[xref] = path
+    return path
+
+
+def _page_markdown(doc, page_num: int, store: ImageStore, xref_paths: dict) -> tuple:
+    """(markdown страницы, решение probe_pdf_page)"""
+    page = doc[page_num]
     md_lines = []
-    os.makedirs(image_dir, exist_ok=True)
 
-    for page_num in range(len(doc)):
-        page = doc[page_num]
+    # Извлечение текста
+    text = page.get_text("text")
+    probe = probe_pdf_page(page, text)
+    if probe["route"] == "render":
+        # Текст не выбрасываем (подписи, частичный OCR-слой), но помечаем страницу для рендера и OCR/VLM
+        md_lines.append(f"<!-- page {page_num + 1}: render ({probe['reason']}) -->")
+    md_lines.append(text)
+
+    # Извлечение таблиц (если есть, через pandas или pdfplumber)
+    # tables = page.find_tables()  # fitz может находить таблицы
+    # for table in tables:
+    #     df = pandas.DataFrame(table)
+    #     md_lines.append(df.to_markdown())
 
-        # Извлечение текста
+    # Извлечение изображений (ссылка по хешу содержимого)
+    for img in page.get_images():
+        image_path = _store_xref(doc, img[0], store, xref_paths)
+        md_lines.append(f"\n![Image]({image_path})\n")
+
+    return "\n\n".join(md_lines), probe
+
+
+# Пороги маршрутизации страниц PDF между дешёвым текстом и рендером + OCR/VLM
+MIN_CHARS_PER_SQ_INCH = 0.5    # реже — текстового слоя фактически нет
+MAX_GARBLED_RATIO = 0.1        # доля мусорных/private-use глифов — битая кодировка шрифта
+SCAN_IMAGE_COVERAGE = 0.6      # страница почти целиком картинка...
+SCAN_MAX_CHARS_PER_SQ_INCH = 5.0  # ...и текста на ней мало — скан с OCR-слоем или подписями
+GARBLED_CATEGORIES = {"private_use", "other"}
+
+
+def probe_pdf_page(page, text: str | None = None) -> dict:
+    """
+    Быстрая оценка текстового слоя страницы без рендера.
+    route: "text" — хватит get_text, "render" — нужен рендер страницы и OCR/VLM.
+    text — уже извлечённый page.get_text("text"), чтобы не доставать его второй раз.
+    """
+    import fitz
+    from log import get_char_language
+
+    rect = page.rect
+    area_sq_inch = max(rect.width * rect.height / (72 * 72), 1e-6)
+    if text is None:
         text = page.get_text("text")
-        md_lines.append(text)
-
-        # Извлечение таблиц (если есть, через pandas или pdfplumber)
-        # tables = page.find_tables()  # fitz может находить таблицы
-        # for table in tables:
-        #     df = pd.DataFrame(table)
-        #     md_lines.append(df.to_markdown())
-
-        # Извлечение изображений
-        image_list = page.get_images()
-        for img_index, img in enumerate(image_list):
-            xref = img[0]
-            base_image = doc.extract_image(xref)
-            image_bytes = base_image["image"]
-            image_ext = base_image["ext"]
-            image_filename = f"{image_dir}/page_{page_num}_img_{img_index}.{image_ext}"
-            with open(image_filename, "wb") as img_file:
-                img_file.write(image_bytes)
-            md_lines.append(f"\n![Image](./{image_filename})\n")
+    chars = [c for c in text if not c.isspace()]
+    garbled = sum(1 for c in chars if c == "\ufffd" or get_char_language(c) in GARBLED_CATEGORIES)
 
-    return "\n\n".join(md_lines)
+    image_area = 0.0
+    for info in page.get_image_info():
+        bbox = fitz.Rect(info["bbox"]) & rect
+        if not bbox.is_empty:
+            image_area += bbox.width * bbox.height
+    image_coverage = min(1.0, image_area / max(rect.width * rect.height, 1e-6))
+
+    chars_per_sq_inch = len(chars) / area_sq_inch
+    garbled_ratio = garbled / len(chars) if chars else 0.0
+
+    if chars_per_sq_inch < MIN_CHARS_PER_SQ_INCH:
+        route, reason = "render", "no_text_layer"
+    elif garbled_ratio > MAX_GARBLED_RATIO:
+        route, reason = "render", "garbled_text"
+    elif image_coverage >= SCAN_IMAGE_COVERAGE and chars_per_sq_inch < SCAN_MAX_CHARS_PER_SQ_INCH:
+        route, reason = "render", "scanned"
+    else:
+        route, reason = "text", "ok"
+
+    return {
+        "page": page.number,
+        "chars": len(chars),
+        "chars_per_sq_inch": round(chars_per_sq_inch, 2),
+        "garbled_ratio": round(garbled_ratio, 4),
+        "image_coverage": round(image_coverage, 4),
+        "route": route,
+        "reason": reason,
+    }
+
+
+def probe_pdf(filepath: str) -> list:
+    """Решение по каждой странице; рендерить и слать в VLM стоит только страницы с route == "render" """
+    import fitz
+    with fitz.open(filepath) as doc:
+        return [probe_pdf_page(page) for page in doc]
+
+
+def _pdf_range_job(filepath: str, start: int, stop: int, image_dir: str) -> list:
+    """Выполняется в процессе пула: свой дескриптор документа на диапазон страниц"""
+    import fitz
+    store, xref_paths = ImageStore(image_dir), {}
+    with fitz.open(filepath) as doc:
+        return [_page_markdown(doc, page_num, store, xref_paths) for page_num in range(start, stop)]
+
+
+def iter_pdf_pages(filepath: str, image_dir: str = "./images", workers: int = 0,
+                   executor: ProcessPoolExecutor | None = None, with_probe: bool = False):
+    """
+    Генератор markdown по страницам в исходном порядке.
+    with_probe=True — пары (markdown, решение probe_pdf_page): страницы с route == "render"
+    вызывающий рендерит и отправляет в OCR/VLM, остальные берёт как есть.
+    При workers > 0 (или переданном executor) страницы со второй делятся на диапазоны
+    и разбираются в пуле процессов, а первая — сразу в текущем процессе,
+    так что первый фрагмент готов через одну страницу.
+    """
+    for item in _iter_pdf_pages(filepath, image_dir, workers, executor):
+        yield item if with_probe else item[0]
+
+
+def _iter_pdf_pages(filepath: str, image_dir: str, workers: int, executor: ProcessPoolExecutor | None):
+    import fitz
+    store, xref_paths = ImageStore(image_dir), {}
+    doc = fitz.open(filepath)
+    try:
+        page_count = len(doc)
+        if page_count <= 1 or (workers <= 0 and executor is None):
+            for page_num in range(page_count):
+                yield _page_markdown(doc, page_num, store, xref_paths)
+            return
+
+        own_executor = executor is None
+        pool = executor or ProcessPoolExecutor(max_workers=workers)
+        try:
+            n_workers = workers or getattr(pool, "_max_workers", 1)
+            # Диапазоны помельче числа воркеров — для балансировки и ранней отдачи
+            step = max(1, math.ceil((page_count - 1) / (n_workers * 4)))
+            futures = [
+                pool.submit(_pdf_range_job, filepath, start, min(start + step, page_count), image_dir)
+                for start in range(1, page_count, step)
+            ]
+            yield _page_markdown(doc, 0, store, xref_paths)
+            for future in futures:
+                yield from future.result()
+        finally:
+            if own_executor:
+                pool.shutdown(cancel_futures=True)
+    finally:
+        doc.close()
+
+
+@register_backend("pdf")
+def parse_pdf(filepath: str, image_dir: str = "./images", workers: int = 0) -> str:
+    return "\n\n".join(iter_pdf_pages(filepath, image_dir, workers=workers))
+
+
+@register_backend("image")
+def parse_image(filepath: str, image_dir: str = "./images") -> str:
+    """Картинка как документ: сохраняем в хранилище, текст даст OCR/VLM по ссылке"""
+    with open(filepath, "rb") as f:
+        data = f.read()
+    ext = Path(filepath).suffix.lower().lstrip(".") or "bin"
+    return f"![Image]({ImageStore(image_dir).put(data, ext)})"
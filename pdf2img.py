@@ -1,20 +1,15 @@
-import fitz  # PyMuPDF
 import cv2
-import numpy as np
+
+from raster import rasterizer
 
 def pdf_to_image(pdf_path, output_size=(1920, 1080)):
-    doc = fitz.open(pdf_path)
-    page = doc.load_page(0)  # первая страница
-    
-    # Рендерим с высоким DPI (рассчитываем zoom для ~1920x1080)
-    zoom = max(output_size) / max(page.rect.width, page.rect.height)
-    mat = fitz.Matrix(zoom, zoom)
-    pix = page.get_pixmap(matrix=mat)
-    
-    # Конвертируем в numpy array
-    img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 3)
+    width, height = rasterizer.page_size(pdf_path, 0)  # первая страница
+
+    # Рендерим с высоким DPI (рассчитываем zoom для ~1920x1080); рендер кешируется в raster.py
+    zoom = max(output_size) / max(width, height)
+    img = rasterizer.render_page(pdf_path, 0, zoom)
     img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)  # fitz использует RGB, OpenCV — BGR
-    
+
     # Ресайз до точного размера
     img = cv2.resize(img, output_size)
     return img
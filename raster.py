@@ -0,0 +1,189 @@
+import hashlib
+import math
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+# Общий растеризатор PDF для pdf2img / dslogo / logo: страница рендерится один раз на (файл, масштаб)
+RASTER_CACHE_MB = int(os.getenv("RASTER_CACHE_MB", "512"))
+PDF_DPI = 72  # scale = dpi / 72
+
+
+@lru_cache(maxsize=1024)
+def _digest(path: str, size: int, mtime_ns: int) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 содержимого; повторно не считается, пока файл не изменился"""
+    path = os.path.realpath(path)
+    st = os.stat(path)
+    return _digest(path, st.st_size, st.st_mtime_ns)
+
+
+def _samples_array(pix) -> np.ndarray:
+    """(H, W, n) поверх pix.samples без декодирования; учитывает stride"""
+    arr = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)
+    return arr[:, :pix.width * pix.n].reshape(pix.height, pix.width, pix.n)
+
+
+def pixmap_to_numpy(pix) -> np.ndarray:
+    """
+    fitz.Pixmap -> (H, W, 3) RGB uint8, прозрачность накладывается на белый фон.
+    Без PNG: пиксели берутся прямо из pix.samples; результат может быть только для чтения.
+    """
+    import fitz
+    if pix.colorspace is None:
+        # Маска без цвета: альфа — это "чернила" на белом
+        ink = _samples_array(pix)[..., -1]
+        return np.repeat((255 - ink)[..., None], 3, axis=2)
+    if pix.colorspace.n not in (1, 3):
+        # CMYK и прочие — преобразование цвета средствами MuPDF, альфа сохраняется
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+
+    arr = _samples_array(pix)
+    n_color = pix.colorspace.n
+    if not pix.alpha and n_color == 3:
+        return arr
+
+    # Поканально в выходной буфер: в разы быстрее арифметики по срезам (H, W, 3) с шагом
+    out = np.empty((pix.height, pix.width, 3), dtype=np.uint8)
+    if pix.alpha:
+        # MuPDF хранит цвет уже умноженным на альфу (c <= a): на белом фоне это c + (255 - a)
+        inv = 255 - arr[..., -1]
+        for i in range(3):
+            np.add(arr[..., min(i, n_color - 1)], inv, out=out[..., i])
+    else:
+        for i in range(3):
+            out[..., i] = arr[..., 0]
+    return out
+
+
+def pixmap_to_pil(pix):
+    """То же, что pixmap_to_numpy, но PIL.Image в режиме RGB"""
+    from PIL import Image
+    return Image.fromarray(pixmap_to_numpy(pix))
+
+
+def _render_range_job(path: str, pages: list, scale: float) -> list:
+    """Выполняется в процессе пула: [(страница, height, width, n, сырые байты RGB)]"""
+    import fitz
+    matrix = fitz.Matrix(scale, scale)
+    result = []
+    with fitz.open(path) as doc:
+        for page_num in pages:
+            pix = doc.load_page(page_num).get_pixmap(matrix=matrix, colorspace=fitz.csRGB, alpha=False)
+            result.append((page_num, pix.height, pix.width, pix.n, pix.samples))
+    return result
+
+
+class PageRasterizer:
+    """
+    Рендер страниц PDF в numpy (H, W, 3) RGB uint8 c LRU-кешем по (sha256 файла, страница, масштаб).
+    Массивы из кеша общие и только для чтения — менять их нужно через копию (cv2.cvtColor и т.п. и так копируют).
+    """
+
+    def __init__(self, max_bytes: int = RASTER_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.cache: OrderedDict = OrderedDict()
+        self.cached_bytes = 0
+        self.page_sizes = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _get(self, key) -> np.ndarray | None:
+        with self.lock:
+            img = self.cache.get(key)
+            if img is None:
+                self.misses += 1
+                return None
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return img
+
+    def _put(self, key, img: np.ndarray):
+        img.flags.writeable = False
+        with self.lock:
+            if key in self.cache or img.nbytes > self.max_bytes:
+                return
+            self.cache[key] = img
+            self.cached_bytes += img.nbytes
+            while self.cached_bytes > self.max_bytes:
+                _, evicted = self.cache.popitem(last=False)
+                self.cached_bytes -= evicted.nbytes
+
+    def _sizes(self, path: str) -> list:
+        digest = file_digest(path)
+        sizes = self.page_sizes.get(digest)
+        if sizes is None:
+            import fitz
+            with fitz.open(path) as doc:
+                sizes = [(p.rect.width, p.rect.height) for p in doc]
+            self.page_sizes[digest] = sizes
+        return sizes
+
+    def page_size(self, path: str, page: int = 0) -> tuple:
+        """(ширина, высота) страницы в пунктах — без рендера, нужно для расчёта масштаба"""
+        return self._sizes(path)[page]
+
+    def page_count(self, path: str) -> int:
+        return len(self._sizes(path))
+
+    def render(self, path: str, pages=None, scale: float = 1.0, workers: int = 0,
+               executor: ProcessPoolExecutor | None = None) -> list:
+        """
+        Массивы страниц pages (по умолчанию все) в исходном порядке.
+        Промахи кеша при workers > 0 (или переданном executor) рендерятся диапазонами в пуле процессов.
+        """
+        digest = file_digest(path)
+        if pages is None:
+            pages = range(self.page_count(path))
+        pages = list(pages)
+
+        found = {p: self._get((digest, p, scale)) for p in dict.fromkeys(pages)}
+        missing = [p for p, img in found.items() if img is None]
+
+        if missing:
+            if workers <= 0 and executor is None or len(missing) == 1:
+                rendered = _render_range_job(path, missing, scale)
+            else:
+                own_executor = executor is None
+                pool = executor or ProcessPoolExecutor(max_workers=workers)
+                try:
+                    n_workers = workers or getattr(pool, "_max_workers", 1)
+                    step = max(1, math.ceil(len(missing) / n_workers))
+                    futures = [pool.submit(_render_range_job, path, missing[i:i + step], scale)
+                               for i in range(0, len(missing), step)]
+                    rendered = [item for future in futures for item in future.result()]
+                finally:
+                    if own_executor:
+                        pool.shutdown(cancel_futures=True)
+
+            for page_num, height, width, n, samples in rendered:
+                img = np.frombuffer(samples, dtype=np.uint8).reshape(height, width, n)
+                self._put((digest, page_num, scale), img)
+                found[page_num] = img
+
+        return [found[p] for p in pages]
+
+    def render_page(self, path: str, page: int = 0, scale: float = 1.0) -> np.ndarray:
+        return self.render(path, [page], scale)[0]
+
+    def render_dpi(self, path: str, page: int = 0, dpi: float = PDF_DPI) -> np.ndarray:
+        return self.render_page(path, page, dpi / PDF_DPI)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"pages": len(self.cache), "bytes": self.cached_bytes, "hits": self.hits, "misses": self.misses}
+
+
+rasterizer = PageRasterizer()